@@ -0,0 +1,75 @@
+"""Command-line entry point for the bill pipeline.
+
+    python bills.py run --chamber pbills --stage enrich
+    python bills.py run --chamber all --stage extract
+    python bills.py run --chamber sbills --stage ingest --dry-run
+
+Each stage is one of the chamber scripts. Its module is imported only when the
+stage runs, and OpenAI/Firebase/OCR clients are created on first use, so the
+start-up cost is just what the stage needs. Arguments after the known options
+are passed on to the stage.
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+CHAMBERS = ["pbills", "sbills"]
+
+# Stage name -> script module inside each chamber directory
+STAGES = {
+    "scrape": "scrape",
+    "extract": "extraction",
+    "ingest": "save_to_firestore_add_pdf",
+    "enrich": "save_to_firestore_fields",
+    "backfill": "backfill_index",
+    "related": "related_bills",
+    "listing": "listing",
+    "migrate": "analysis",
+    "export": "export",
+    "repair": "repair",
+}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def run_stage(chamber, stage, stage_args, dry_run=False):
+    """Import a chamber's stage module and run its main(), reporting start-up and run time."""
+    start = time.perf_counter()
+    os.chdir(ROOT)  # The scripts use paths relative to the repository root
+    sys.path.insert(0, os.path.join(ROOT, chamber))
+    sys.argv = [os.path.join(chamber, STAGES[stage] + ".py")] + stage_args
+
+    module = importlib.import_module(STAGES[stage])
+    startup = time.perf_counter() - start
+    print(f"[{chamber} {stage}] started in {startup * 1000:.0f} ms")
+    if dry_run:
+        return
+
+    module.main()
+    print(f"[{chamber} {stage}] finished in {time.perf_counter() - start:.1f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stage of the bill pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run one pipeline stage")
+    run.add_argument("--chamber", choices=CHAMBERS + ["all"], required=True)
+    run.add_argument("--stage", choices=sorted(STAGES), required=True)
+    run.add_argument("--dry-run", action="store_true", help="Import the stage and report start-up time without running it")
+
+    args, stage_args = parser.parse_known_args()
+
+    if args.chamber == "all":
+        # Chamber scripts share module names, so each chamber runs in its own interpreter
+        for chamber in CHAMBERS:
+            command = [sys.executable, os.path.abspath(__file__), "run", "--chamber", chamber, "--stage", args.stage]
+            if args.dry_run:
+                command.append("--dry-run")
+            subprocess.run(command + stage_args, check=True)
+    else:
+        run_stage(args.chamber, args.stage, stage_args, args.dry_run)
+
+if __name__ == "__main__":
+    main()
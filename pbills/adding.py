@@ -1,30 +1,126 @@
-import openai
 import re
 import os
+import json
+import threading
+import time
 from dotenv import load_dotenv
+from metadata import extract_date as extract_date_with_rules, parse_date
+from checkpoint import atomic_write_json
 
 # Load environment variables from the .env file (if needed for local testing)
 # load_dotenv()
 
-# Set up OpenAI API key
-openai_api_key = os.getenv('OPENAIKEY')  # Ensure this matches the secret name in GitHub
-if openai_api_key is None:
-    raise ValueError("OPENAI_KEY environment variable is not set.")
+_openai = None
 
-openai.api_key = openai_api_key
+def get_openai():
+    """Import and configure the OpenAI client on first use, so importing this module needs no API key."""
+    global _openai
+    if _openai is None:
+        import openai
+
+        # Set up OpenAI API key
+        openai_api_key = os.getenv('OPENAIKEY')  # Ensure this matches the secret name in GitHub
+        if openai_api_key is None:
+            raise ValueError("OPENAI_KEY environment variable is not set.")
+
+        openai.api_key = openai_api_key
+        _openai = openai
+    return _openai
+
+# Near-duplicates at least this similar reuse the earlier bill's enrichment
+REUSE_SIMILARITY = 0.9
+
+# Models from cheapest to strongest. Each task starts at its routed model and moves
+# up a tier only when the output fails validation. Override with the MODEL_TIERS
+# (comma-separated) and MODEL_ROUTES (JSON, task -> model) environment variables.
+MODEL_TIERS = ["gpt-4o-mini", "gpt-4"]
+MODEL_ROUTES = {
+    "description": "gpt-4o-mini",
+    "positives": "gpt-4o-mini",
+    "negatives": "gpt-4o-mini",
+    "date": "gpt-4o-mini",
+}
+MODEL_USAGE_PATH = "pbills/model_usage.json"
+DESCRIPTION_MAX_WORDS = 25   # the prompt asks for fewer than 23; allow a little slack before escalating
+ENTRY_COUNT = 10
+
+# Calls, rejected outputs, latency and tokens per model for this run
+model_usage = {}
+usage_lock = threading.Lock()  # enrichment workers record usage from several threads
+
+def load_routing():
+    """Return (tiers, routes) from the environment, falling back to MODEL_TIERS and MODEL_ROUTES."""
+    tiers = [model.strip() for model in os.getenv("MODEL_TIERS", "").split(",") if model.strip()] or MODEL_TIERS
+    routes = dict(MODEL_ROUTES)
+    routes.update(json.loads(os.getenv("MODEL_ROUTES") or "{}"))
+    for task, model in routes.items():
+        if model not in tiers:
+            raise ValueError(f"MODEL_ROUTES sends {task} to {model}, which is not in MODEL_TIERS.")
+    return tiers, routes
+
+def record_usage(model, seconds, usage, accepted):
+    """Add one call's latency and token counts to the model's totals."""
+    with usage_lock:
+        stats = model_usage.setdefault(
+            model, {"calls": 0, "rejected": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats["calls"] += 1
+        stats["rejected"] += 0 if accepted else 1
+        stats["seconds"] += seconds
+        stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+def ask_model(task, prompt, validate, temperature=0.2):
+    """Send prompt to the model routed for task, escalating to stronger tiers while validate(content) fails.
+
+    Returns the first output that validates, or the strongest tier's output if none does.
+    """
+    tiers, routes = load_routing()
+    for model in tiers[tiers.index(routes.get(task, tiers[0])):]:
+        start = time.perf_counter()
+        response = get_openai().ChatCompletion.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature
+        )
+        content = response['choices'][0]['message']['content'].strip()
+        accepted = validate(content)
+        record_usage(model, time.perf_counter() - start, response.get('usage', {}), accepted)
+        if accepted:
+            return content
+        print(f"{task}: output from {model} failed validation")
+    return content
+
+def print_model_usage():
+    """Print this run's calls, rejection count, mean latency and tokens per model."""
+    for model, stats in model_usage.items():
+        print(
+            f"{model}: {stats['calls']} calls, {stats['rejected']} rejected, "
+            f"{stats['seconds'] / stats['calls']:.2f} s/call, "
+            f"{stats['prompt_tokens']} prompt + {stats['completion_tokens']} completion tokens"
+        )
+
+def save_model_usage(path=MODEL_USAGE_PATH):
+    """Add this run's usage to the running totals in path."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            totals = json.load(f)
+    except FileNotFoundError:
+        totals = {}
+    for model, stats in model_usage.items():
+        model_totals = totals.setdefault(model, dict.fromkeys(stats, 0))
+        for key, value in stats.items():
+            model_totals[key] = model_totals.get(key, 0) + value
+    atomic_write_json(path, totals, indent=2)
 
 def generate_description(bill_text):
     """Generate a short description for the bill using OpenAI's GPT model."""
     truncated_text = bill_text[:3000]
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4",  # Ensure the model name is correct
-        messages=[
-            {"role": "user", "content": f"Generate a description of less than 23 words for the following bill (do not start with the bill name or Kenyan bill): {truncated_text}"}
-        ],
-        temperature=0.2 
+
+    return ask_model(
+        "description",
+        f"Generate a description of less than 23 words for the following bill (do not start with the bill name or Kenyan bill): {truncated_text}",
+        lambda content: 0 < len(content.split()) <= DESCRIPTION_MAX_WORDS
     )
-    return response['choices'][0]['message']['content'].strip()
 
 def clean_text(text):
     """Remove leading/trailing whitespace, numbers, and unwanted symbols from the text."""
@@ -45,73 +141,99 @@ def format_entry(entry):
     else:
         return {"title": "", "explanation": ""}  # Return empty dictionary if format is incorrect
 
+def parse_entries(content):
+    """Return the well-formed 'title : explanation' entries in a model response."""
+    entries = [format_entry(line) for line in content.split('\n')]
+    return [entry for entry in entries if entry["title"] and entry["explanation"]]  # Ensure valid entries
+
+def usable_entries(entries):
+    """Return the entries with both a title and an explanation, dropping repeated titles."""
+    usable, titles = [], set()
+    for entry in entries or []:
+        title = (entry.get("title") or "").strip()
+        if title and (entry.get("explanation") or "").strip() and title.lower() not in titles:
+            usable.append(entry)
+            titles.add(title.lower())
+    return usable
+
+def generate_missing_entries(kind, bill_text, entries):
+    """Top up a positives or negatives list to ENTRY_COUNT, asking the model only for the missing entries."""
+    missing = ENTRY_COUNT - len(entries)
+    if missing <= 0:
+        return entries
+    truncated_text = bill_text[:3000]
+    titles = set(entry["title"].strip().lower() for entry in entries)
+
+    def new_entries(content):
+        return usable_entries([entry for entry in parse_entries(content) if entry["title"].lower() not in titles])
+
+    existing = "; ".join(entry["title"] for entry in entries)
+    avoid = f", different from these: {existing}" if existing else ""
+    content = ask_model(
+        kind,
+        f"Generate {missing} concise {kind} in the format 'Short title (4 to 5 words) : explanation (not more than 30 words).' relevant to the following bill{avoid}: {truncated_text}",
+        lambda content: len(new_entries(content)) >= missing
+    )
+    return entries + new_entries(content)[:missing]
+
 def generate_positives(bill_text):
-    """Generate 10 positives for the bill using OpenAI's GPT model."""
+    """Generate up to 10 positives for the bill using OpenAI's GPT model."""
     truncated_text = bill_text[:3000]
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4",  
-        messages=[
-            {"role": "user", "content": f"Generate 10 concise positives in the format 'Short title (4 to 5 words) : explanation (not more than 30 words).' relevant to the following bill: {truncated_text}"}
-        ],
-        temperature=0.2 
+
+    content = ask_model(
+        "positives",
+        f"Generate 10 concise positives in the format 'Short title (4 to 5 words) : explanation (not more than 30 words).' relevant to the following bill: {truncated_text}",
+        lambda content: len(parse_entries(content)) >= ENTRY_COUNT
     )
-    
-    # Process the response to extract and format positives
-    positives = response['choices'][0]['message']['content'].strip().split('\n')
-    formatted_positives = [format_entry(pos) for pos in positives if format_entry(pos)["title"] and format_entry(pos)["explanation"]]  # Ensure valid entries
-    
-    # Ensure we have exactly 10 positives, filling with empty dictionaries if necessary
-    while len(formatted_positives) < 10:
-        formatted_positives.append({"title": "", "explanation": ""})  # Placeholder for missing positives
-    
-    return formatted_positives  # Return formatted positives
+
+    # Process the response to extract and format positives; fewer than 10 are stored as they are
+    return parse_entries(content)[:ENTRY_COUNT]
 
 def generate_negatives(bill_text):
-    """Generate 10 negatives for the bill using OpenAI's GPT model."""
+    """Generate up to 10 negatives for the bill using OpenAI's GPT model."""
     truncated_text = bill_text[:3000]
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4", 
-        messages=[
-            {"role": "user", "content": f"Generate 10 concise negatives in the format 'Short title (4 to 5 words) : explanation (not more than 30 words).' relevant to the following bill: {truncated_text}"}
-        ],
-        temperature=0.2  
+
+    content = ask_model(
+        "negatives",
+        f"Generate 10 concise negatives in the format 'Short title (4 to 5 words) : explanation (not more than 30 words).' relevant to the following bill: {truncated_text}",
+        lambda content: len(parse_entries(content)) >= ENTRY_COUNT
     )
-    
-    # Process the response to extract and format negatives
-    negatives = response['choices'][0]['message']['content'].strip().split('\n')
-    formatted_negatives = [format_entry(neg) for neg in negatives if format_entry(neg)["title"] and format_entry(neg)["explanation"]]  # Ensure valid entries
-    
-    # Ensure we have exactly 10 negatives, filling with empty dictionaries if necessary
-    while len(formatted_negatives) < 10:
-        formatted_negatives.append({"title": "", "explanation": ""})  # Placeholder for missing negatives
-    
-    return formatted_negatives  # Return formatted negatives
+
+    # Process the response to extract and format negatives; fewer than 10 are stored as they are
+    return parse_entries(content)[:ENTRY_COUNT]
 
 def extract_date_with_model(bill_text):
     """Use the model to extract the relevant date associated with the bill."""
     truncated_text = bill_text[:3000]
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4", 
-        messages=[
-            {"role": "user", "content": f"Extract the relevant date from the following bill text. Return only the date without any additional text: {truncated_text}"}
-        ],
-        temperature=0.2  
+    return ask_model(
+        "date",
+        f"Extract the relevant date from the following bill text. Return only the date in YYYY-MM-DD format without any additional text: {truncated_text}",
+        lambda content: parse_date(content) is not None
     )
-    
-    return response['choices'][0]['message']['content'].strip()
 
 def extract_date(bill_text):
-    """Extract a relevant date associated with the bill."""
-    date_from_model = extract_date_with_model(bill_text)
+    """Extract the bill's date as an ISO string, asking the model only if the rules in metadata.py find none."""
+    date_from_rules = extract_date_with_rules(bill_text)
+    if date_from_rules:
+        return date_from_rules
+
+    date_from_model = parse_date(extract_date_with_model(bill_text))
     if date_from_model:
         return date_from_model  # Return the date found by the model
     return "Unknown"  # Return "Unknown" if no date was found
 
-def process_bill(bill):
-    """Process a single bill, adding description, positives/negatives, and date if not already present."""
+def process_bill(bill, source=None):
+    """Process a single bill, adding description, positives/negatives, and date if not already present.
+
+    If source is the enriched document of a near-duplicate bill, its description,
+    positives and negatives are reused instead of being generated again.
+    """
+    if source:
+        for key in ["description", "positives", "negatives"]:
+            if not bill.get(key) and source.get(key):
+                bill[key] = source[key]
+
     bill_text = bill.get("text", "")
     if bill_text:
         if not bill.get("description"):
@@ -0,0 +1,111 @@
+import argparse
+import json
+from firebase_client import get_db
+from throttle import throttled_call, FIRESTORE_URL
+
+CHAMBER = "pbills"
+ANALYSIS_FIELDS = ["positives", "negatives"]
+ANALYSIS_COLLECTION = "analysis"
+ANALYSIS_DOC_ID = "current"
+
+MIGRATION_BATCH = 200        # documents per batch; each moves with two writes, under Firestore's 500
+
+def drop_placeholders(entries):
+    """Remove the empty {title, explanation} entries that older runs padded lists to 10 with."""
+    return [entry for entry in entries or [] if entry.get("title") or entry.get("explanation")]
+
+def analysis_ref(doc_ref):
+    """The subdocument holding a bill's positives and negatives: <collection>/<doc_id>/analysis/current."""
+    return doc_ref.collection(ANALYSIS_COLLECTION).document(ANALYSIS_DOC_ID)
+
+def split_analysis(bill):
+    """Pop positives and negatives off bill and return them as the analysis subdocument.
+
+    bill["analysis"] is set to the entry counts, which is all the main document keeps.
+    """
+    analysis = {key: drop_placeholders(bill.pop(key, None)) for key in ANALYSIS_FIELDS}
+    bill["analysis"] = {key: len(entries) for key, entries in analysis.items()}
+    if bill.get("enriched_from"):
+        analysis["enriched_from"] = bill["enriched_from"]
+    return analysis
+
+def stage_enrichment(batch, doc_ref, bill, fields):
+    """Add an enriched bill's writes to batch: the analysis subdocument, and fields of the
+    main document, removing positives/negatives stored there by older runs."""
+    from firebase_admin import firestore
+
+    batch.set(analysis_ref(doc_ref), split_analysis(bill))
+    update = {key: bill[key] for key in fields if key in bill}
+    update.update({key: firestore.DELETE_FIELD for key in ANALYSIS_FIELDS})
+    update["updated_at"] = firestore.SERVER_TIMESTAMP
+    batch.update(doc_ref, update)
+
+def stage_repair(batch, doc_ref, bill, fields):
+    """Add writes of only the repaired fields of bill to batch: positives/negatives merge into the
+    analysis subdocument (with the counts updated), other fields go to the main document."""
+    from firebase_admin import firestore
+
+    lists = {key: bill[key] for key in fields if key in ANALYSIS_FIELDS}
+    update = {key: bill[key] for key in fields if key not in ANALYSIS_FIELDS}
+    if lists:
+        batch.set(analysis_ref(doc_ref), lists, merge=True)
+        update["analysis"] = dict(bill.get("analysis") or {}, **{key: len(entries) for key, entries in lists.items()})
+    update["updated_at"] = firestore.SERVER_TIMESTAMP
+    batch.update(doc_ref, update)
+
+def load_analysis(doc_ref, bill):
+    """Add a bill's positives and negatives to bill, from its subdocument or, before migration, the bill itself."""
+    if "analysis" in bill:
+        snapshot = analysis_ref(doc_ref).get()
+        if snapshot.exists:
+            stored = snapshot.to_dict()
+            bill.update({key: stored[key] for key in ANALYSIS_FIELDS if key in stored})
+    for key in ANALYSIS_FIELDS:
+        if key in bill:
+            bill[key] = drop_placeholders(bill[key])
+    return bill
+
+def migrate(check=False):
+    """Move inline positives/negatives of every document into its analysis subdocument."""
+    from firebase_admin import firestore
+
+    db = get_db()
+    bills_ref = db.collection(CHAMBER)
+    batch = db.batch()
+    queued = migrated = moved_bytes = 0
+
+    for doc in bills_ref.stream():
+        bill = doc.to_dict()
+        if not any(key in bill for key in ANALYSIS_FIELDS):
+            continue
+        moved_bytes += sum(len(json.dumps(bill[key])) for key in ANALYSIS_FIELDS if key in bill)
+        analysis = split_analysis(bill)
+        migrated += 1
+        if check:
+            continue
+
+        batch.set(analysis_ref(doc.reference), analysis)
+        batch.update(doc.reference, dict(
+            {key: firestore.DELETE_FIELD for key in ANALYSIS_FIELDS},
+            analysis=bill["analysis"], updated_at=firestore.SERVER_TIMESTAMP))
+        queued += 1
+        if queued >= MIGRATION_BATCH:
+            throttled_call(FIRESTORE_URL, batch.commit)
+            print(f"Migrated {migrated} documents")
+            batch = db.batch()
+            queued = 0
+
+    if queued:
+        throttled_call(FIRESTORE_URL, batch.commit)
+    action = "Would migrate" if check else "Migrated"
+    print(f"{action} {migrated} documents, moving {moved_bytes / 1024:.0f} KB out of the {CHAMBER} documents.")
+
+def main():
+    """Migrate existing documents to the split layout."""
+    parser = argparse.ArgumentParser(description="Move positives and negatives into analysis subdocuments.")
+    parser.add_argument("--check", action="store_true", help="Count the documents and bytes to move without writing")
+    args = parser.parse_args()
+    migrate(args.check)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from firebase_client import get_db
+from fingerprints import sha256_text
+from search_index import open_index, index_bill, set_doc_id, CHAMBER
+from text_fetch import create_session, fetch_text_from_url
+
+BACKFILL_FIELDS = ["title", "source_url", "pdf_url", "text_url", "text_sha256"]
+
+def indexed_bills(conn):
+    """Return {pdf_url: (doc_id, text_sha256)} for every bill in the index."""
+    return {
+        pdf_url: (doc_id, text_sha256)
+        for pdf_url, doc_id, text_sha256 in conn.execute("SELECT pdf_url, doc_id, text_sha256 FROM bills")
+    }
+
+def backfill(docs=None, conn=None):
+    """Index the chamber's Firestore documents that the local search index is missing or holds stale text for.
+
+    docs are document snapshots with at least BACKFILL_FIELDS (by default the
+    whole collection is read). A document's text_url is fetched only when the
+    index has no text for its source_url, or has text with another
+    text_sha256; indexed bills whose doc_id wasn't recorded just get it set.
+    Returns the number of bills (re)indexed.
+    """
+    conn = conn or open_index()
+    if docs is None:
+        docs = get_db().collection(CHAMBER).select(BACKFILL_FIELDS).stream()
+    indexed = indexed_bills(conn)
+    session = None
+    added = linked = failed = 0
+
+    for doc in docs:
+        bill = doc.to_dict()
+        # Documents ingested before source_url was recorded are keyed by their stored pdf_url
+        pdf_url = bill.get("source_url") or bill.get("pdf_url")
+        if not pdf_url or not bill.get("text_url"):
+            continue
+
+        doc_id, text_sha256 = indexed.get(pdf_url, (None, None))
+        if pdf_url in indexed and (not bill.get("text_sha256") or text_sha256 == bill["text_sha256"]):
+            if doc_id != doc.id:
+                set_doc_id(conn, pdf_url, doc.id)
+                linked += 1
+            continue
+
+        session = session or create_session()
+        text = fetch_text_from_url(session, bill["text_url"])
+        if not text:
+            failed += 1
+            continue
+        indexed_bill = {
+            "pdf_url": pdf_url,
+            "title": bill.get("title"),
+            "text": text,
+            "text_sha256": bill.get("text_sha256") or sha256_text(text),
+            "doc_id": doc.id,
+        }
+        if index_bill(conn, indexed_bill, CHAMBER):
+            added += 1
+        set_doc_id(conn, pdf_url, doc.id)
+        indexed[pdf_url] = (doc.id, indexed_bill["text_sha256"])
+
+    print(f"Search index backfill: {added} {CHAMBER} bills indexed, {linked} linked to their documents, "
+          f"{failed} texts could not be fetched.")
+    return added
+
+def main():
+    """Fill the chamber's search index from the documents already in Firestore."""
+    backfill()
+
+if __name__ == "__main__":
+    main()
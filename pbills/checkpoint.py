@@ -0,0 +1,52 @@
+import json
+import os
+
+def _fsync_directory(path):
+    """Flush a directory entry so a rename inside it survives a crash."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write JSON to a temp file, fsync it and rename it over path, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+def append_jsonl(path, record):
+    """Append one record as a JSON line and fsync it before returning."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def iter_jsonl(path):
+    """Lazily yield the records of a JSONL file, skipping a torn last line left by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable line {line_number} in {path}")
+
+def clear_jsonl(path):
+    """Atomically empty a JSONL file once every record in it has been consumed."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
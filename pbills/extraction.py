@@ -1,96 +1,555 @@
+import argparse
 import json
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from urllib.request import urlopen
-from io import BytesIO
-from pdf2image import convert_from_bytes
-import pytesseract
+import os
+import shutil
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+import re
+import threading
 from tqdm import tqdm
+from fingerprints import (
+    load_fingerprints, save_fingerprints, sha256_text, FINGERPRINTS_PATH,
+    probe_all, validators_changed, update_validators, record_stage, hashes_to_urls,
+)
+from search_index import open_index, index_bill, load_corpus, INDEX_PATH, CHAMBER
+from near_duplicates import load_indexes, minhash_signature, find_near_duplicate, MinHashIndex
+from checkpoint import append_jsonl, atomic_write_json, iter_jsonl
+from throttle import MAX_LIMIT
+from download import download_to_file, discard
+from metadata import extract_metadata
+from normalise import normalise_pages
+from scheduling import publication_month, content_length, order_by_freshness
+from admission import MemoryAdmission, MemorySampler, children_peak, memory_budget, read_proc_status, MIB
+from sharding import parse_shard, in_shard, shard_dir, SHARDS_DIR
+
+FULL_LIST_PATH = "pbills/full_list.json"
+PROCESSED_LIST_PATH = "pbills/processed_list.json"
+OUTPUT_PATH = "pbills/parliament-bills.jsonl"
+OCR_WORKERS = 6              # most bills rasterised and OCR'd at once; the memory budget may admit fewer
+BOILERPLATE_PATH = "pbills/boilerplate_pages.json"
+PAGE_BATCH = 8               # pages rasterised at a time, so memory doesn't grow with the page count
+
+# Memory estimate for admission control
+RASTER_DPI = 200             # pdf2image's default resolution
+RASTER_COPIES = 2            # pages are pickled to the OCR processes, so each is held twice
+OCR_PROCESSES = min(PAGE_BATCH, os.cpu_count() or 1)  # a bill's OCR worker pool; a batch has at most PAGE_BATCH pages
+OCR_PROCESS_MB = 150         # one OCR worker and the tesseract process it runs, before correction
+DEFAULT_PAGE_SIZE_PTS = (595.0, 842.0)  # A4, when pdfinfo reports no page size
+PAGE_SIZE = re.compile(r"([\d.]+) x ([\d.]+) pts")
+
+# Pre-OCR page classification thresholds (measured on a downscaled greyscale thumbnail)
+THUMBNAIL_SIZE = (256, 256)
+INK_LEVEL = 128              # pixels darker than this count as ink
+BLANK_CONTRAST = 32          # for blank detection, pixels this much darker than the paper count as ink
+BLANK_INK_COVERAGE = 0.0003  # fraction of ink pixels below which a page is blank (one line of 12pt text is ~0.003)
+BLANK_STDDEV = 10.0          # pixel standard deviation below which a page is blank
+BLANK_PAGE_TEXT = "\f"       # keep the page break tesseract would have emitted
+
+# Perceptual hashing of boilerplate (cover/back) pages
+HASH_SIZE = 16               # 16x16 difference hash, 256 bits
+HASH_MAX_DISTANCE = 8        # bits that may differ for a page to match a template
+INK_BOX_TOLERANCE = 0.03     # fraction of the page each edge of the ink bounding box may move
+INK_COVERAGE_TOLERANCE = 0.2  # relative difference in ink coverage allowed between a page and its template
+TEMPLATE_MIN_BILLS = 3       # bills that must share identical OCR text before a page becomes a template
+BOILERPLATE_EDGE_PAGES = 2   # only the first/last content pages of a bill are template candidates
+
+def page_thumbnail(image):
+    """Return a small greyscale copy of a rendered page for cheap classification."""
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    return thumbnail
+
+def is_blank_page(thumbnail):
+    """Decide from ink coverage and pixel variance whether a page carries no text.
+
+    Downscaling blurs thin strokes into grey well above INK_LEVEL, so a page
+    holding only a dateline or a single line would look empty. Any pixel
+    clearly darker than the paper (the most common level) counts as ink here.
+    """
+    from PIL import ImageStat
+
+    histogram = thumbnail.histogram()
+    paper = max(range(len(histogram)), key=histogram.__getitem__)
+    ink_coverage = sum(histogram[:max(0, paper - BLANK_CONTRAST)]) / float(sum(histogram))
+    stddev = ImageStat.Stat(thumbnail).stddev[0]
+    return ink_coverage < BLANK_INK_COVERAGE and stddev < BLANK_STDDEV
+
+def ink_signature(thumbnail):
+    """Return the bounding box of a page's ink, as fractions of the page, and the fraction of ink pixels."""
+    mask = thumbnail.point(lambda pixel: 255 if pixel < INK_LEVEL else 0)
+    box = mask.getbbox() or (0, 0, 0, 0)
+    histogram = thumbnail.histogram()
+    return {
+        "box": [round(edge / size, 3) for edge, size in zip(box, thumbnail.size * 2)],
+        "coverage": round(sum(histogram[:INK_LEVEL]) / float(sum(histogram)), 4),
+    }
+
+def page_hash(thumbnail):
+    """Compute a difference hash of a page thumbnail as a hex string."""
+    small = thumbnail.resize((HASH_SIZE + 1, HASH_SIZE))
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return f"{bits:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+def hash_distance(first, second):
+    """Number of differing bits between two hex page hashes."""
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+def ink_matches(ink, template_ink):
+    """Whether a page's ink sits where the template's does and covers about as much of the page."""
+    if any(abs(edge - template_edge) > INK_BOX_TOLERANCE for edge, template_edge in zip(ink["box"], template_ink["box"])):
+        return False
+    return abs(ink["coverage"] - template_ink["coverage"]) <= INK_COVERAGE_TOLERANCE * template_ink["coverage"]
+
+def match_template(hash_value, ink, templates):
+    """Return the stored text of the boilerplate template matching a page's hash and ink, if any.
+
+    A difference hash only compares brightness gradients of a 16x16 grid, so a
+    sparse page (a dateline, a short schedule) can come within HASH_MAX_DISTANCE
+    of a template, and its text would be silently replaced. The ink check
+    rejects those: a served template costs a wrong page, a rejected one only
+    costs the OCR call, so the tolerances are kept tight.
+    """
+    for template in templates:
+        if hash_distance(hash_value, template["hash"]) <= HASH_MAX_DISTANCE and ink_matches(ink, template["ink"]):
+            return template["text"]
+    return None
+
+def load_boilerplate(path=BOILERPLATE_PATH):
+    """Load known boilerplate pages and promotion candidates."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            boilerplate = json.load(f)
+    except FileNotFoundError:
+        return {"templates": [], "candidates": []}
+    # Pages recorded before they carried an ink signature can't be confirmed, so they are learned again
+    for key in ["templates", "candidates"]:
+        boilerplate[key] = [page for page in boilerplate[key] if "ink" in page]
+    return boilerplate
+
+def save_boilerplate(boilerplate, path=BOILERPLATE_PATH):
+    atomic_write_json(path, boilerplate, indent=2)
+
+def record_boilerplate(boilerplate, pages):
+    """Count OCR'd pages that recur verbatim across bills and promote them to templates."""
+    content_pages = [page for page in pages if page[2] != "blank"]
+    edge_pages = content_pages[:BOILERPLATE_EDGE_PAGES] + content_pages[BOILERPLATE_EDGE_PAGES:][-BOILERPLATE_EDGE_PAGES:]
+
+    seen_in_bill = set()
+    for hash_value, text, source, ink in edge_pages:
+        if source != "ocr" or not text.strip():
+            continue
+        for candidate in boilerplate["candidates"]:
+            if candidate["text"] == text and hash_distance(hash_value, candidate["hash"]) <= HASH_MAX_DISTANCE:
+                if id(candidate) not in seen_in_bill:
+                    candidate["bills"] += 1
+                    seen_in_bill.add(id(candidate))
+                break
+        else:
+            candidate = {"hash": hash_value, "ink": ink, "text": text, "bills": 1}
+            boilerplate["candidates"].append(candidate)
+            seen_in_bill.add(id(candidate))
+
+    for candidate in list(boilerplate["candidates"]):
+        if candidate["bills"] >= TEMPLATE_MIN_BILLS:
+            boilerplate["templates"].append({key: candidate[key] for key in ["hash", "ink", "text"]})
+            boilerplate["candidates"].remove(candidate)
+            print(f"Promoted boilerplate page {candidate['hash'][:12]}... to a template")
+
+def classify_page(image, templates):
+    """Return (hash, text, source, ink) for a page without OCR, or (hash, None, "ocr", ink) if OCR is needed."""
+    thumbnail = page_thumbnail(image)
+    if is_blank_page(thumbnail):
+        return None, BLANK_PAGE_TEXT, "blank", None
+    hash_value = page_hash(thumbnail)
+    ink = ink_signature(thumbnail)
+    template_text = match_template(hash_value, ink, templates)
+    if template_text is not None:
+        return hash_value, template_text, "template", ink
+    return hash_value, None, "ocr", ink
+
+def estimate_ocr_memory(pdf_info):
+    """Estimate the bytes a bill holds while rasterised: one PAGE_BATCH of RGB pages at RASTER_DPI,
+    plus OCR_PROCESSES OCR processes."""
+    match = PAGE_SIZE.match(pdf_info.get("Page size", ""))
+    width_pts, height_pts = (float(match[1]), float(match[2])) if match else DEFAULT_PAGE_SIZE_PTS
+    page_bytes = (width_pts / 72 * RASTER_DPI) * (height_pts / 72 * RASTER_DPI) * 3
+    pages = min(PAGE_BATCH, pdf_info.get("Pages", 1))
+    return int(pages * page_bytes * RASTER_COPIES + min(OCR_PROCESSES, pages) * OCR_PROCESS_MB * MIB)
 
 # Function to extract text from a scanned PDF URL
-def extract_text_from_pdf(pdf_url):
+def extract_text_from_pdf(pdf_url, templates=(), known_hashes=None, ocr_slots=None, admission=None):
+    """Return the bill text, content fingerprints and a (hash, text, source, ink) record per page.
+
+    The PDF is streamed to the download cache and rasterised from there,
+    PAGE_BATCH pages at a time. If its bytes hash to a PDF in known_hashes, OCR
+    is skipped and "duplicate_of" names the pdf_url the content was already
+    extracted under. ocr_slots (a semaphore) bounds how many bills are
+    rasterised at once, so downloads can run ahead of OCR, and admission (a
+    MemoryAdmission) holds a bill back until its estimated memory fits.
+    """
+    # Imported here so the parent process and other stages don't pay for the OCR stack
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    import pytesseract
+
     try:
-        with urlopen(pdf_url) as response:
-            pdf_content = BytesIO(response.read())
+        pdf_path, content_sha256, validators = download_to_file(pdf_url)
+
+        if known_hashes and content_sha256 in known_hashes:
+            discard(pdf_path)
+            return {"text": "", "raw_text": "", "pages": [], "sha256": content_sha256, "validators": validators,
+                    "duplicate_of": known_hashes[content_sha256]}
+
+        # Size the job from the page count and page dimensions before rendering anything
+        pdf_info = pdfinfo_from_path(pdf_path)
+        page_count = pdf_info["Pages"]
+        estimate = estimate_ocr_memory(pdf_info)
+
+        pages = []
+        with ocr_slots or nullcontext(), admission.admit(estimate) if admission else nullcontext(), \
+                MemorySampler() as sampler:
+            with ProcessPoolExecutor(max_workers=OCR_PROCESSES) as pool:
+                for first_page in range(1, page_count + 1, PAGE_BATCH):
+                    # poppler reads the cached file itself; only this batch of pages is held in memory
+                    images = convert_from_path(pdf_path, dpi=RASTER_DPI, first_page=first_page,
+                                               last_page=min(first_page + PAGE_BATCH - 1, page_count))
+
+                    # Skip blank pages and serve known boilerplate pages before paying for OCR
+                    batch = [classify_page(image, templates) for image in images]
+                    to_ocr = [index for index, (_, _, source, _) in enumerate(batch) if source == "ocr"]
 
-        # Convert PDF to images
-        images = convert_from_bytes(pdf_content.read())
+                    # Process pages in parallel
+                    results = pool.map(pytesseract.image_to_string, [images[index] for index in to_ocr])
+                    for index, result in zip(to_ocr, results):
+                        batch[index] = (batch[index][0], result, "ocr", batch[index][3])
+                    del images
+                    pages.extend(batch)
 
-        # Process pages in parallel
-        with ProcessPoolExecutor() as pool:
-            results = pool.map(pytesseract.image_to_string, images)
+        if admission:
+            # What the process grew by, plus the OCR processes at the largest size any reached
+            admission.observe(estimate, sampler.peak + min(OCR_PROCESSES, page_count) * children_peak())
 
-        text = "\n".join(results)
-        return text.strip()
+        skipped = sum(1 for _, _, source, _ in pages if source != "ocr")
+        if skipped:
+            print(f"Skipped OCR for {skipped} of {len(pages)} pages in {pdf_url}")
+
+        raw_text = "\n".join(page_text for _, page_text, _, _ in pages)
+
+        # Strip headers, page numbers and stamps, and rejoin wrapped lines, before the text is stored or sent to GPT
+        text = normalise_pages([page_text for _, page_text, _, _ in pages])
+        return {"text": text, "raw_text": raw_text.strip(), "pages": pages, "sha256": content_sha256,
+                "validators": validators, "duplicate_of": None}
 
     except Exception as e:
         print(f"Error processing {pdf_url}: {str(e)}")
-        return ""
+        return {"text": "", "raw_text": "", "pages": [], "sha256": None, "validators": None, "duplicate_of": None}
 
-# Load the JSON data from full_list.json and processed_list.json
-with open("pbills/full_list.json", "r") as f:
-    full_list = json.load(f)
+def state_path(path, shard):
+    """Where a run writes a state file: the file itself, or its copy in the shard's directory."""
+    return os.path.join(shard_dir(shard), os.path.basename(path)) if shard else path
 
-with open("pbills/processed_list.json", "r") as f:
-    processed_list = json.load(f)
+def resume_path(path, shard):
+    """Where a run reads a state file from: a shard resumes from its own copy once it has one."""
+    copy = state_path(path, shard)
+    return copy if os.path.exists(copy) else path
 
-# Create sets of titles for each list
-full_titles = set(bill['title'] for bill in full_list)
-processed_titles = set(bill['title'] for bill in processed_list)
+def merge_shards():
+    """Fold the state written by --shard runs back into the chamber's files and remove the shard directories.
 
-# Find the difference between the two sets (bills in full_list but not in processed_list)
-difference_titles = full_titles - processed_titles
+    Each shard started from the shared files and only extracted bills whose
+    pdf_url hashes to it, so its fingerprints are taken for those bills and
+    everything else is a union.
+    """
+    shard_dirs = sorted(glob(os.path.join(SHARDS_DIR, "*-of-*")))
+    if not shard_dirs:
+        print("No shard output to merge.")
+        return
 
-# Print the number of bills in full_list but not in processed_list
-count = len(difference_titles)
-print(f"Number of bills in full_list but not in processed_list: {count}")
+    with open(PROCESSED_LIST_PATH, "r") as f:
+        processed_list = json.load(f)
+    processed_titles = set(bill["title"] for bill in processed_list)
+    fingerprints = load_fingerprints()
+    boilerplate = load_boilerplate()
+    original_counts = {(c["hash"], c["text"]): c["bills"] for c in boilerplate["candidates"]}
+    minhash_index, _ = load_indexes()
+    search_index = open_index()
 
-# Print the titles of these bills
-print("\nTitles of bills not in processed_list:")
-for title in difference_titles:
-    print(title)
+    for directory in shard_dirs:
+        shard = parse_shard(os.path.basename(directory).replace("-of-", "/"))
+        merged = 0
+        for extracted in iter_jsonl(state_path(OUTPUT_PATH, shard)):
+            append_jsonl(OUTPUT_PATH, extracted)
+            merged += 1
 
-# Filter full_list to only include bills that are not in processed_list
-bills_to_process = [bill for bill in full_list if bill['title'] in difference_titles]
+        if os.path.exists(state_path(PROCESSED_LIST_PATH, shard)):
+            with open(state_path(PROCESSED_LIST_PATH, shard), "r") as f:
+                for bill in json.load(f):
+                    if bill["title"] not in processed_titles:
+                        processed_list.append(bill)
+                        processed_titles.add(bill["title"])
 
-# Create a ThreadPoolExecutor
-with ProcessPoolExecutor(max_workers=6) as executor:
-    # Submit tasks and store futures
-    future_to_bill = {
-        executor.submit(extract_text_from_pdf, bill["pdf_url"]): bill for bill in bills_to_process
-    }
+        for pdf_url, record in load_fingerprints(state_path(FINGERPRINTS_PATH, shard)).items():
+            if in_shard(pdf_url, shard) or pdf_url not in fingerprints:
+                fingerprints[pdf_url] = record
+
+        # Boilerplate templates are unioned; candidate counts add what each shard saw on top of the shared file
+        shard_boilerplate = load_boilerplate(state_path(BOILERPLATE_PATH, shard))
+        template_hashes = set(template["hash"] for template in boilerplate["templates"])
+        for template in shard_boilerplate["templates"]:
+            if template["hash"] not in template_hashes:
+                boilerplate["templates"].append(template)
+                template_hashes.add(template["hash"])
+        for candidate in shard_boilerplate["candidates"]:
+            key = (candidate["hash"], candidate["text"])
+            added = candidate["bills"] - original_counts.get(key, 0)
+            if added <= 0:
+                continue
+            existing = next((c for c in boilerplate["candidates"] if (c["hash"], c["text"]) == key), None)
+            if existing:
+                existing["bills"] += added
+            else:
+                boilerplate["candidates"].append(dict(candidate, bills=added))
+
+        shard_minhash = MinHashIndex(state_path(minhash_index.path, shard), CHAMBER)
+        for pdf_url, signature in shard_minhash.entries.items():
+            # A bill the shard re-extracted (its PDF changed) replaces its old signature
+            if in_shard(pdf_url, shard) or pdf_url not in minhash_index.entries:
+                minhash_index.add(pdf_url, signature)
+
+        for bill in load_corpus({CHAMBER: state_path(INDEX_PATH, shard)}):
+            index_bill(search_index, bill, CHAMBER)
+
+        print(f"Merged {merged} extracted bills from {directory}")
+
+    record_boilerplate(boilerplate, [])  # promote candidates that reached TEMPLATE_MIN_BILLS across shards
+    atomic_write_json(PROCESSED_LIST_PATH, processed_list, indent=2)
+    save_fingerprints(fingerprints)
+    save_boilerplate(boilerplate)
+    minhash_index.save()
+    search_index.close()
+
+    for directory in shard_dirs:
+        shutil.rmtree(directory)
+
+def main():
+    """Extract text from every new or changed bill and append it to the output file."""
+    parser = argparse.ArgumentParser(description="OCR new or changed bills.")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="Only extract bills whose pdf_url hashes to shard i of N (i/N), writing state to "
+                             + SHARDS_DIR + "/i-of-N")
+    parser.add_argument("--merge-shards", action="store_true", help="Fold the output of --shard runs into the shared files")
+    args = parser.parse_args()
+
+    if args.merge_shards:
+        merge_shards()
+        return
+
+    # A shard reads the shared state but writes its own copy, folded back in by --merge-shards
+    if args.shard:
+        os.makedirs(shard_dir(args.shard), exist_ok=True)
+    output_path = state_path(OUTPUT_PATH, args.shard)
+    processed_list_path = state_path(PROCESSED_LIST_PATH, args.shard)
+
+    # Load the JSON data from full_list.json and processed_list.json
+    with open(FULL_LIST_PATH, "r") as f:
+        full_list = json.load(f)
+
+    with open(resume_path(PROCESSED_LIST_PATH, args.shard), "r") as f:
+        processed_list = json.load(f)
+
+    # Create sets of titles for each list
+    full_titles = set(bill['title'] for bill in full_list)
+    processed_titles = set(bill['title'] for bill in processed_list)
+
+    # Find the difference between the two sets (bills in full_list but not in processed_list)
+    difference_titles = full_titles - processed_titles
+
+    # Print the number of bills in full_list but not in processed_list
+    count = len(difference_titles)
+    print(f"Number of bills in full_list but not in processed_list: {count}")
+
+    # Print the titles of these bills
+    print("\nTitles of bills not in processed_list:")
+    for title in difference_titles:
+        print(title)
+
+    # Filter full_list to only include bills that are not in processed_list
+    new_bills = [bill for bill in full_list if bill['title'] in difference_titles]
+
+    # Check already processed bills for a replaced PDF using their HTTP validators
+    fingerprints = load_fingerprints(resume_path(FINGERPRINTS_PATH, args.shard))
+    new_urls = set(bill["pdf_url"] for bill in new_bills)
+    known_bills = [
+        bill for bill in full_list
+        if bill["pdf_url"] not in new_urls and bill["pdf_url"] != "Unknown" and bill["title"] in processed_titles
+    ]
+
+    # A shard run only handles the bills whose pdf_url hashes to it
+    new_bills = [bill for bill in new_bills if in_shard(bill["pdf_url"], args.shard)]
+    known_bills = [bill for bill in known_bills if in_shard(bill["pdf_url"], args.shard)]
+    validators_by_url = probe_all([bill["pdf_url"] for bill in known_bills])
+
+    changed_bills = []
+    for bill in known_bills:
+        record = fingerprints.get(bill["pdf_url"])
+        validators = validators_by_url[bill["pdf_url"]]
+        if record is None:
+            # Processed before fingerprints were recorded, so the current validators become the baseline
+            fingerprints[bill["pdf_url"]] = {"title": bill["title"]}
+            update_validators(fingerprints[bill["pdf_url"]], validators)
+        elif validators_changed(record, validators):
+            print(f"PDF changed on the server: {bill['title']}")
+            changed_bills.append(bill)
+
+    print(f"Number of processed bills whose PDF changed: {len(changed_bills)}")
+
+    # Newest bills first, and the largest PDFs of each month first: new bills are published
+    # sooner and the longest OCR jobs don't start last. New bills are sized with a HEAD request.
+    validators_by_url.update(probe_all([bill["pdf_url"] for bill in new_bills]))
+    bills_to_process = order_by_freshness(
+        new_bills + changed_bills,
+        lambda bill: publication_month(bill["pdf_url"]),
+        lambda bill: content_length(validators_by_url.get(bill["pdf_url"])),
+    )
+
+    # Content already extracted under any pdf_url is not OCR'd again
+    known_hashes = hashes_to_urls(fingerprints)
+    extracted_count = 0
+    text_sizes = {"raw": 0, "normalised": 0}
+
+    # Extracted text goes into the local full-text search index as each bill completes
+    search_index = open_index(state_path(INDEX_PATH, args.shard))
+
+    # Near-duplicates (amended versions, the same bill listed by both chambers) are flagged for reuse
+    minhash_index, minhash_indexes = load_indexes()
+    if args.shard:
+        minhash_index = minhash_indexes[CHAMBER] = MinHashIndex(resume_path(minhash_index.path, args.shard), CHAMBER)
+        minhash_index.path = state_path(minhash_index.path, args.shard)
+
+    # Load known boilerplate pages so workers can skip OCR on them
+    boilerplate = load_boilerplate(resume_path(BOILERPLATE_PATH, args.shard))
+
+    def handle_result(bill, result):
+        """Record a finished extraction in the fingerprints and indexes. Returns the bill to output, or None."""
+        record = fingerprints.setdefault(bill["pdf_url"], {})
+        record["title"] = bill["title"]
+        update_validators(record, result["validators"])
+
+        if result["duplicate_of"]:
+            if result["duplicate_of"] == bill["pdf_url"]:
+                print(f"Content unchanged, skipping: {bill['title']}")
+            else:
+                # Same bytes under a new listing (e.g. a cosmetic title change): reuse the earlier work
+                original = fingerprints[result["duplicate_of"]]
+                record.update(sha256=result["sha256"], alias_of=result["duplicate_of"])
+                record["stages"] = dict(original.get("stages", {}))
+                if original.get("doc_id"):
+                    record["doc_id"] = original["doc_id"]
+                print(f"Same content as {result['duplicate_of']}, skipping: {bill['title']}")
+            return None
+
+        bill["text"] = result["text"]
+        if result["pages"]:
+            bill["page_count"] = len(result["pages"])  # lets enrichment schedule long bills early
+        record_boilerplate(boilerplate, result["pages"])
+
+        # Date, bill number and gazette supplement come from fixed phrasings, so enrichment needn't ask GPT.
+        # They are read from the raw OCR text, since normalisation strips the running headers that carry them.
+        for key, value in extract_metadata(result["raw_text"], bill["title"]).items():
+            bill.setdefault(key, value)
+
+        if result["raw_text"]:
+            text_sizes["raw"] += len(result["raw_text"])
+            text_sizes["normalised"] += len(bill["text"])
+            print(f"Normalised text from {len(result['raw_text'])} to {len(bill['text'])} characters: {bill['title']}")
+
+        if result["sha256"]:
+            # Record which PDF the text was extracted from so later stages can tell what changed
+            bill["content_sha256"] = result["sha256"]
+            bill["text_sha256"] = sha256_text(bill["text"])
+            record["sha256"] = result["sha256"]
+            record.pop("alias_of", None)
+            record_stage(record, "extract", result["sha256"], output=bill["text_sha256"])
+            if record.get("doc_id"):
+                bill["doc_id"] = record["doc_id"]
+
+        if bill["text"]:
+            signature = minhash_signature(bill["text"])
+            near_duplicate = find_near_duplicate(minhash_indexes, bill["pdf_url"], signature)
+            if near_duplicate:
+                print(f"Near-duplicate of {near_duplicate['pdf_url']} ({near_duplicate['similarity']}): {bill['title']}")
+                bill["duplicate_of"] = near_duplicate
+            minhash_index.add(bill["pdf_url"], signature)
+
+        index_bill(search_index, bill)
+        return bill
+
+    def checkpoint_bill(bill, extracted):
+        """Durably append an extracted bill to the output and mark it processed.
+
+        The output line is fsynced before the processed list is atomically replaced,
+        so a crash loses at most the bills still in flight and a restart resumes
+        with the next unprocessed bill.
+        """
+        if extracted:
+            append_jsonl(output_path, extracted)
+
+        if bill["title"] not in processed_titles:
+            processed_list.append({"pdf_url": bill["pdf_url"], "title": bill["title"]})
+            processed_titles.add(bill["title"])
+            atomic_write_json(processed_list_path, processed_list, indent=2)
+
+        save_fingerprints(fingerprints, state_path(FINGERPRINTS_PATH, args.shard))
+        save_boilerplate(boilerplate, state_path(BOILERPLATE_PATH, args.shard))
+        minhash_index.save()
+
+    # Downloads run ahead (paced by the host's limiter) while OCR_WORKERS bills are OCR'd at a time
+    ocr_slots = threading.BoundedSemaphore(OCR_WORKERS)
+    admission = MemoryAdmission(memory_budget())
+    print(f"OCR memory budget: {admission.budget / MIB:.0f} MB")
+    with ThreadPoolExecutor(max_workers=MAX_LIMIT) as executor:
+        # Submit tasks and store futures
+        future_to_bill = {
+            executor.submit(extract_text_from_pdf, bill["pdf_url"], boilerplate["templates"], known_hashes, ocr_slots, admission): bill
+            for bill in bills_to_process
+        }
+
+        # Process completed tasks with progress bar
+        for future in tqdm(
+            as_completed(future_to_bill), total=len(bills_to_process), desc="Extracting text"
+        ):
+            bill = future_to_bill.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing {bill['pdf_url']}: {str(e)}")
+                result = {"text": "", "raw_text": "", "pages": [], "sha256": None, "validators": None, "duplicate_of": None}
+
+            extracted = handle_result(bill, result)
+            checkpoint_bill(bill, extracted)
+            if extracted:
+                extracted_count += 1
+                del extracted["text"]  # Only the output file keeps the text
+
+    search_index.close()
+
+    peak_rss = read_proc_status("VmHWM")
+    if peak_rss:
+        print(f"Peak RSS {peak_rss / MIB:.0f} MB, peak reserved {admission.peak_reserved / MIB:.0f} MB "
+              f"of {admission.budget / MIB:.0f} MB, estimate correction {admission.correction:.2f}")
+
+    if text_sizes["raw"]:
+        saved = 1 - text_sizes["normalised"] / text_sizes["raw"]
+        print(f"Text normalisation: {text_sizes['raw']} -> {text_sizes['normalised']} characters ({saved:.0%} smaller)")
+
+    print(f"Extraction complete. {extracted_count} bills appended to {output_path}")
+    print(f"Processed list updated. Data saved to {processed_list_path}")
 
-    # Process completed tasks with progress bar
-    for future in tqdm(
-        as_completed(future_to_bill), total=len(bills_to_process), desc="Extracting text"
-    ):
-        bill = future_to_bill[future]
-        try:
-            bill["text"] = future.result()
-        except Exception as e:
-            print(f"Error processing {bill['pdf_url']}: {str(e)}")
-            bill["text"] = ""
-
-# Append the pdf_url and title of the processed bills to processed_list.json
-for bill in bills_to_process:
-    processed_list.append({"pdf_url": bill["pdf_url"], "title": bill["title"]})
-
-# Save the updated processed_list to a JSON file
-processed_list_path = r"pbills\processed_list.json"
-with open(processed_list_path, "w", encoding="utf-8") as f:
-    json.dump(processed_list, f, ensure_ascii=False, indent=2)
-
-# Save the extracted data to a JSON file
-output_path = "pbills\parliament-bills.json"
-
-# Check if any bills were processed
-if bills_to_process:
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(bills_to_process, f, ensure_ascii=False, indent=2)
-else:
-    # If no bills were processed, create an empty JSON file
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump([], f)
-
-
-print(f"Extraction complete. Data saved to {output_path}")
-print(f"Processed list updated. Data saved to {processed_list_path}")
+if __name__ == "__main__":
+    main()
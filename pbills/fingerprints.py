@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from checkpoint import atomic_write_json
+from throttle import limiter_for
+
+FINGERPRINTS_PATH = "pbills/fingerprints.json"
+
+def load_fingerprints(path=FINGERPRINTS_PATH):
+    """Load the per-bill fingerprint records, keyed by the listing pdf_url."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_fingerprints(fingerprints, path=FINGERPRINTS_PATH):
+    """Save the fingerprint records atomically."""
+    atomic_write_json(path, fingerprints, indent=2)
+
+def sha256_bytes(data):
+    """Return the hex SHA-256 of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_text(text):
+    """Return the hex SHA-256 of a text string (UTF-8 encoded)."""
+    return sha256_bytes(text.encode("utf-8"))
+
+def validators_from_headers(headers):
+    """Pick the HTTP validators we track out of a response's headers."""
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "content_length": headers.get("Content-Length"),
+    }
+
+def probe_validators(pdf_url, timeout=30):
+    """Fetch the HTTP validators for a PDF with a HEAD request. Returns None on failure."""
+    try:
+        with limiter_for(pdf_url).slot() as slot:
+            try:
+                with urlopen(Request(pdf_url, method="HEAD"), timeout=timeout) as response:
+                    return validators_from_headers(response.headers)
+            except HTTPError as e:
+                slot.record(e.code, e.headers.get("Retry-After"))
+                raise
+    except Exception as e:
+        print(f"Error probing {pdf_url}: {str(e)}")
+        return None
+
+def probe_all(pdf_urls, max_workers=16):
+    """Probe validators for many PDFs concurrently. Returns {pdf_url: validators or None}."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(pdf_urls, executor.map(probe_validators, pdf_urls)))
+
+def validators_changed(record, validators):
+    """Return True if the server's validators show the PDF differs from the recorded one."""
+    if not validators:
+        return False  # Can't tell, so don't force a re-download
+    for key in ("etag", "last_modified", "content_length"):
+        if record.get(key) and validators.get(key):
+            return record[key] != validators[key]
+    return False
+
+def update_validators(record, validators):
+    """Store fresh validators on a record, keeping old values the server didn't send."""
+    for key, value in (validators or {}).items():
+        if value:
+            record[key] = value
+
+def stage_is_current(record, stage, input_hash):
+    """Return True if a stage's stored output was computed from input_hash."""
+    return bool(input_hash) and record.get("stages", {}).get(stage, {}).get("input") == input_hash
+
+def record_stage(record, stage, input_hash, **outputs):
+    """Record that a stage ran on input_hash, along with any output hashes or ids."""
+    record.setdefault("stages", {})[stage] = dict(input=input_hash, **outputs)
+
+def hashes_to_urls(fingerprints):
+    """Map each known content SHA-256 to the pdf_url it was first recorded under."""
+    known = {}
+    for pdf_url, record in fingerprints.items():
+        if record.get("sha256") and not record.get("alias_of"):
+            known.setdefault(record["sha256"], pdf_url)
+    return known
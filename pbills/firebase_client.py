@@ -0,0 +1,44 @@
+import json
+import os
+
+_app = None
+_emulator_db = None
+
+def get_app():
+    """Initialize the Firebase Admin SDK on first use, from the FIREBASE_CREDENTIALS environment variable."""
+    global _app
+    if _app is None:
+        import firebase_admin
+        from firebase_admin import credentials
+
+        firebase_credentials = os.getenv('FIREBASE_CREDENTIALS')  # This should be the entire JSON string
+        if firebase_credentials is None:
+            raise ValueError("FIREBASE_CREDENTIALS environment variable is not set.")
+
+        # Parse the JSON string into a dictionary
+        cred = credentials.Certificate(json.loads(firebase_credentials))
+        _app = firebase_admin.initialize_app(cred, {"storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET')})
+    return _app
+
+def get_db():
+    """Return the Firestore client, initializing Firebase if needed.
+
+    With FIRESTORE_EMULATOR_HOST set, the client talks to the local emulator
+    instead, without credentials, in project FIRESTORE_PROJECT_ID.
+    """
+    global _emulator_db
+    if os.getenv('FIRESTORE_EMULATOR_HOST'):
+        if _emulator_db is None:
+            from google.auth.credentials import AnonymousCredentials
+            from google.cloud import firestore
+
+            _emulator_db = firestore.Client(
+                project=os.getenv('FIRESTORE_PROJECT_ID', 'demo-bills'), credentials=AnonymousCredentials())
+        return _emulator_db
+    from firebase_admin import firestore
+    return firestore.client(get_app())
+
+def get_bucket():
+    """Return the Storage bucket, initializing Firebase if needed."""
+    from firebase_admin import storage
+    return storage.bucket(app=get_app())
@@ -0,0 +1,118 @@
+import re
+from datetime import date
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sept", "sep"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+# "20th August, 2024", "1st  Aug 2024" (OCR often adds spaces or drops the comma)
+DAY_MONTH_YEAR = re.compile(
+    rf"\b(\d{{1,2}})\s*(?:st|nd|rd|th)?\s+({MONTH_PATTERN})\.?,?\s+(\d{{4}})\b", re.IGNORECASE)
+# "August 20, 2024"
+MONTH_DAY_YEAR = re.compile(
+    rf"\b({MONTH_PATTERN})\.?\s+(\d{{1,2}})\s*(?:st|nd|rd|th)?,?\s+(\d{{4}})\b", re.IGNORECASE)
+# "20/08/2024" or "20-08-2024"
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b")
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+
+# The assent/publication line at the end of a gazetted bill, e.g. "NAIROBI, 20th August, 2024"
+DATELINE = re.compile(r"\bNAIROBI\s*[,.]?\s*(.{6,40})", re.IGNORECASE)
+
+# "(National Assembly Bills No. 12)", "Senate Bill No. 19 of 2024"
+BILL_NUMBER = re.compile(
+    r"\b(National\s+Assembly|Senate)\s+Bills?\s*\(?\s*No\s*\.?\s*(\d+)(?:\s+of\s+(\d{4}))?", re.IGNORECASE)
+# The chamber's own listing titles: "The Sports (Amendment) (No.2) Bill, No.45 of 2024"
+LISTING_BILL_NUMBER = re.compile(r"\bBill\s*,?\s*No\s*\.?\s*(\d+)\s+of\s+(\d{4})", re.IGNORECASE)
+LISTING_CHAMBER = "National Assembly"
+GAZETTE_SUPPLEMENT = re.compile(r"\bKenya\s+Gazette\s+Supplement\s+No\s*\.?\s*(\d+)", re.IGNORECASE)
+# "The Finance Bill, 2024", "THE APPROPRIATION BILL,2024", "Supplementary Appropriation Bill 2024"
+TITLE_YEAR = re.compile(r"\bBill\s*,?\s*((?:19|20)\d{2})\b", re.IGNORECASE)
+
+# Characters after the "Kenya Gazette Supplement No." header that still belong to the cover header.
+# Dates later in a bill are usually those of Acts it cites (e.g. the Constitution, 27th August, 2010).
+HEADER_CHARS = 400
+
+def _make_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+def parse_date(text):
+    """Return the first date in text as an ISO string (YYYY-MM-DD), or None."""
+    if not text:
+        return None
+    candidates = []
+    for match in DAY_MONTH_YEAR.finditer(text):
+        candidates.append((match.start(), _make_date(match[3], MONTHS[match[2].lower()], match[1])))
+    for match in MONTH_DAY_YEAR.finditer(text):
+        candidates.append((match.start(), _make_date(match[3], MONTHS[match[1].lower()], match[2])))
+    for match in NUMERIC_DATE.finditer(text):
+        candidates.append((match.start(), _make_date(match[3], match[2], match[1])))
+    for match in ISO_DATE.finditer(text):
+        candidates.append((match.start(), _make_date(match[1], match[2], match[3])))
+
+    for _, iso_date in sorted(candidates):
+        if iso_date:
+            return iso_date
+    return None
+
+def extract_date(text):
+    """Return the bill's date as ISO from its "NAIROBI, <date>" dateline or its gazette cover header.
+
+    Returns None when neither has a date, rather than guessing from dates cited in the body.
+    """
+    for match in DATELINE.finditer(text or ""):
+        iso_date = parse_date(match[1])
+        if iso_date:
+            return iso_date
+    header = GAZETTE_SUPPLEMENT.search(text or "")
+    if header:
+        return parse_date(text[header.start():header.end() + HEADER_CHARS])
+    return None
+
+def extract_metadata(text, title=""):
+    """Pull the date, bill number, gazette supplement number, chamber and year out of a bill.
+
+    The title is checked before the OCR text for the bill number, since the
+    listing title is typed rather than scanned. Fields that aren't found are
+    left out of the result.
+    """
+    metadata = {}
+
+    iso_date = extract_date(text)
+    if iso_date:
+        metadata["date"] = iso_date
+
+    bill_number = BILL_NUMBER.search(title or "")
+    listing_number = LISTING_BILL_NUMBER.search(title or "")
+    if not bill_number and not listing_number:
+        bill_number = BILL_NUMBER.search(text or "")
+    if bill_number:
+        metadata["chamber"] = "Senate" if bill_number[1].lower() == "senate" else "National Assembly"
+        metadata["bill_number"] = int(bill_number[2])
+    elif listing_number:
+        metadata["chamber"] = LISTING_CHAMBER
+        metadata["bill_number"] = int(listing_number[1])
+
+    supplement = GAZETTE_SUPPLEMENT.search(text or "")
+    if supplement:
+        metadata["gazette_supplement"] = int(supplement[1])
+
+    if bill_number and bill_number[3]:
+        metadata["year"] = int(bill_number[3])
+    elif listing_number and not bill_number:
+        metadata["year"] = int(listing_number[2])
+    elif TITLE_YEAR.search(title or ""):
+        metadata["year"] = int(TITLE_YEAR.search(title)[1])
+    elif iso_date:
+        metadata["year"] = int(iso_date[:4])
+
+    return metadata
@@ -0,0 +1,113 @@
+import re
+from collections import Counter
+
+EDGE_LINES = 3               # lines at the top and bottom of a page checked for running headers/footers
+REPEAT_SHARE = 0.5           # an edge line on at least this share of pages is a header/footer
+MIN_REPEAT_PAGES = 3
+STAMP_MAX_WORDS = 8          # longer lines that match a stamp pattern are kept as bill text
+MIN_ALNUM_SHARE = 0.4        # lines with fewer letters/digits than this are OCR debris
+
+PAGE_NUMBER = re.compile(r"^\W*(?:page\s*)?\d{1,4}(?:\s*of\s*\d{1,4})?\W*$", re.IGNORECASE)
+# Received/registry stamps, e.g. "DIRECTOR LEGAL SERVICE P.O, Bo 41842"
+STAMP = re.compile(
+    r"DIRECTOR\s*,?\s*LEGAL\s+SERVICES?|\bP\s*\.?\s*O\s*[.,]?\s*Box?\s*\d{3,}|^\W*RECEIVED\W*$",
+    re.IGNORECASE,
+)
+# Clause markers that start a new line in legislation: "(a)", "(iv)", "12.", "3A."
+CLAUSE_MARKER = re.compile(r"^(?:\(\w{1,5}\)|\d{1,3}[A-Z]?\.)\s")
+HYPHENATED_BREAK = re.compile(r"(\w)-\n(?=[a-z])")
+EDGE_NUMBERS = re.compile(r"^(?:\d+\s+)+|(?:\s+\d+)+$")
+
+def edge_key(line):
+    """Normalise a header/footer line so running headers with changing numbers compare equal.
+
+    Page numbers lead on verso pages and trail on recto pages ("944 The Finance
+    Bill, 2024", "The Finance Bill, 2024 943"), so leading and trailing numbers
+    are dropped and both sides share a key.
+    """
+    return re.sub(r"\d+", "#", EDGE_NUMBERS.sub("", " ".join(line.lower().split())))
+
+def is_noise(line):
+    """Stamps and OCR debris that carry no bill text."""
+    if STAMP.search(line) and len(line.split()) <= STAMP_MAX_WORDS:
+        return True
+    alnum = sum(1 for char in line if char.isalnum())
+    return alnum < MIN_ALNUM_SHARE * len(line.replace(" ", ""))
+
+def repeated_edge_lines(pages):
+    """Return the edge_keys of lines that head or foot a large share of the pages."""
+    counts = Counter()
+    for lines in pages:
+        lines = [line for line in lines if line]
+        counts.update(set(edge_key(line) for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:]) - {""})
+    threshold = max(MIN_REPEAT_PAGES, REPEAT_SHARE * len(pages))
+    return set(key for key, count in counts.items() if count >= threshold)
+
+def strip_edges(lines, repeated):
+    """Drop headers, footers and page numbers from the top and bottom of a page.
+
+    Page numbers are only recognised here: a number standing alone inside the
+    text (a year wrapped onto its own line, a figure in a table) is kept.
+    """
+    def removable(line):
+        return edge_key(line) in repeated or PAGE_NUMBER.match(line) or is_noise(line)
+
+    start, end, checked = 0, len(lines), 0
+    while start < end and checked < EDGE_LINES:
+        if lines[start]:
+            if not removable(lines[start]):
+                break
+            checked += 1
+        start += 1
+
+    checked = 0
+    while end > start and checked < EDGE_LINES:
+        if lines[end - 1]:
+            if not removable(lines[end - 1]):
+                break
+            checked += 1
+        end -= 1
+    return lines[start:end]
+
+def is_heading(line):
+    letters = [char for char in line if char.isalpha()]
+    return bool(letters) and all(char.isupper() for char in letters)
+
+def join_wrapped_lines(lines):
+    """Join lines that OCR broke mid-sentence, keeping clause markers and headings on their own lines."""
+    joined = []
+    for line in lines:
+        if joined and joined[-1] and line:
+            previous = joined[-1]
+            continuation = not is_heading(previous) and (
+                line[0].islower()
+                or ((previous[-1].isalpha() or previous[-1] == ",") and not CLAUSE_MARKER.match(line) and not is_heading(line))
+            )
+            if continuation:
+                joined[-1] = previous + " " + line
+                continue
+        joined.append(line)
+    return joined
+
+def normalise_pages(page_texts):
+    """Turn per-page OCR output into compact bill text.
+
+    Running headers/footers found across pages, page numbers, received stamps
+    and debris are removed, hyphenated line breaks are mended, wrapped lines are
+    joined and whitespace is collapsed. Blank lines separate paragraphs.
+    """
+    pages = []
+    for page_text in page_texts:
+        pages.append([" ".join(line.split()) for line in page_text.replace("\f", "\n").split("\n")])
+
+    repeated = repeated_edge_lines(pages) if len(pages) >= MIN_REPEAT_PAGES else set()
+
+    lines = []
+    for page_lines in pages:
+        for line in strip_edges(page_lines, repeated):
+            lines.append("" if is_noise(line) else line)
+
+    text = "\n".join(lines)
+    text = HYPHENATED_BREAK.sub(r"\1", text)
+    text = "\n".join(join_wrapped_lines(text.split("\n")))
+    return re.sub(r"\n{2,}", "\n\n", text).strip()
@@ -0,0 +1,159 @@
+import argparse
+import json
+import re
+from collections import Counter
+from backfill_index import backfill
+from search_index import load_corpus
+from checkpoint import atomic_write_json
+from firebase_client import get_db
+from throttle import throttled_call, FIRESTORE_URL
+
+CHAMBER = "pbills"
+RELATED_PATH = "pbills/related_bills.json"
+
+TOP_K = 5                    # neighbours stored per bill
+MIN_SCORE = 0.1              # cosine similarity below which bills aren't considered related
+MIN_DOCUMENT_FREQUENCY = 2   # words found in a single bill can't relate it to anything
+SCORE_BATCH = 256            # new bills scored against the corpus per sparse product
+WORD = re.compile(r"[a-z]{3,}")
+
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+def tfidf_matrix(texts):
+    """Build an L2-normalised sparse TF-IDF matrix with one row per text and sublinear term frequency."""
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, text in enumerate(texts):
+        for word, count in Counter(tokenize(text)).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+            counts.append(count)
+
+    term_frequency = np.log(np.array(counts, dtype=np.float64)) + 1.0
+    matrix = sparse.csr_matrix((term_frequency, (rows, cols)), shape=(len(texts), len(vocabulary)))
+
+    document_frequency = np.bincount(np.array(cols, dtype=np.int64), minlength=len(vocabulary))
+    idf = np.log((1.0 + len(texts)) / (1.0 + document_frequency)) + 1.0
+    idf[document_frequency < MIN_DOCUMENT_FREQUENCY] = 0.0
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+def neighbour_entry(bill, score):
+    return {"collection": bill["chamber"], "doc_id": bill["doc_id"], "title": bill["title"], "score": round(float(score), 4)}
+
+def top_neighbours(scores, corpus, k=TOP_K):
+    """Return the k best-scoring bills above MIN_SCORE as neighbour entries, best first."""
+    import numpy as np
+
+    candidates = np.nonzero(scores >= MIN_SCORE)[0]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+    candidates = candidates[np.argsort(-scores[candidates])]
+    return [neighbour_entry(corpus[index], scores[index]) for index in candidates]
+
+def merge_neighbour(neighbours, entry, k=TOP_K):
+    """Insert entry into an existing neighbour list if it ranks in the top k. Returns True if the list changed."""
+    if any(n["collection"] == entry["collection"] and n["doc_id"] == entry["doc_id"] for n in neighbours):
+        return False
+    if len(neighbours) >= k and entry["score"] <= neighbours[-1]["score"]:
+        return False
+    neighbours.append(entry)
+    neighbours.sort(key=lambda n: n["score"], reverse=True)
+    del neighbours[k:]
+    return True
+
+def load_state(path=RELATED_PATH):
+    """Load the text hash each bill was last scored with and this chamber's neighbour lists."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"scored": {}, "neighbours": {}}
+
+def save_state(state, path=RELATED_PATH):
+    atomic_write_json(path, state, indent=2)
+
+def score_new_bills(corpus, state):
+    """Score bills that are new (or re-extracted) since the last run against the whole corpus.
+
+    New bills of this chamber get a full top-k list; existing bills of this
+    chamber pick up a new bill if it outranks their current neighbours. Existing
+    lists aren't rescored when IDF weights drift as the corpus grows (run with
+    --rebuild for that). Returns the pdf_urls whose neighbour lists changed.
+    """
+    import numpy as np
+
+    scored = state["scored"]
+    neighbours = state["neighbours"]
+    new_rows = [
+        row for row, bill in enumerate(corpus)
+        if scored.get(bill["pdf_url"]) != (bill["text_sha256"] or "")
+    ]
+    if not new_rows:
+        return set()
+
+    matrix = tfidf_matrix([bill["text"] for bill in corpus])
+    new_urls = set(corpus[row]["pdf_url"] for row in new_rows)
+    changed = set()
+
+    for start in range(0, len(new_rows), SCORE_BATCH):
+        batch = new_rows[start:start + SCORE_BATCH]
+        similarities = (matrix[batch] @ matrix.T).toarray()
+
+        for row, scores in zip(batch, similarities):
+            scores[row] = 0.0  # a bill isn't related to itself
+            bill = corpus[row]
+            if bill["chamber"] == CHAMBER:
+                neighbours[bill["pdf_url"]] = top_neighbours(scores, corpus)
+                changed.add(bill["pdf_url"])
+
+            # Existing bills of this chamber that the new bill now ranks for
+            for index in np.nonzero(scores >= MIN_SCORE)[0]:
+                other = corpus[index]
+                if other["chamber"] != CHAMBER or other["pdf_url"] in new_urls:
+                    continue
+                if merge_neighbour(neighbours.setdefault(other["pdf_url"], []), neighbour_entry(bill, scores[index])):
+                    changed.add(other["pdf_url"])
+
+    for row in new_rows:
+        scored[corpus[row]["pdf_url"]] = corpus[row]["text_sha256"] or ""
+    return changed
+
+def main():
+    """Compute related bills for new bills and write the neighbour lists into their Firestore documents."""
+    parser = argparse.ArgumentParser(description="Precompute related bills with TF-IDF cosine similarity.")
+    parser.add_argument("--rebuild", action="store_true", help="Rescore every bill instead of only new ones")
+    args = parser.parse_args()
+
+    # Both chambers' search indexes hold the OCR text; only bills saved to Firestore can be linked.
+    # This chamber's index is first filled with documents extracted before it, or on another machine.
+    backfill()
+    corpus = [bill for bill in load_corpus() if bill["doc_id"] and bill["text"]]
+    state = {"scored": {}, "neighbours": {}} if args.rebuild else load_state()
+    print(f"Corpus: {len(corpus)} bills")
+
+    changed = score_new_bills(corpus, state)
+    print(f"Neighbour lists changed for {len(changed)} {CHAMBER} bills")
+
+    doc_ids = {bill["pdf_url"]: bill["doc_id"] for bill in corpus if bill["chamber"] == CHAMBER}
+    if changed:
+        from firebase_admin import firestore
+        bills_ref = get_db().collection(CHAMBER)
+        for pdf_url in changed:
+            throttled_call(
+                FIRESTORE_URL, bills_ref.document(doc_ids[pdf_url]).update,
+                {"related_bills": state["neighbours"][pdf_url], "updated_at": firestore.SERVER_TIMESTAMP},
+            )
+            print(f"Document {doc_ids[pdf_url]} updated with {len(state['neighbours'][pdf_url])} related bills.")
+
+    save_state(state)
+
+if __name__ == "__main__":
+    main()
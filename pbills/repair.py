@@ -0,0 +1,164 @@
+import argparse
+from collections import Counter
+from adding import (
+    clean_text, generate_description, generate_missing_entries, extract_date, usable_entries,
+    print_model_usage, save_model_usage, ENTRY_COUNT, DESCRIPTION_MAX_WORDS,
+)
+from analysis import ANALYSIS_FIELDS, analysis_ref, load_analysis, stage_repair
+from firebase_client import get_db
+from listing import update_listing
+from metadata import parse_date
+from save_to_firestore_fields import SCAN_FIELDS
+from text_fetch import create_session, fetch_text_from_url
+from throttle import throttled_call, FIRESTORE_URL
+
+CHAMBER = "pbills"
+BATCH_SIZE = 20              # repaired documents per commit
+ANALYSIS_BATCH = 100         # analysis subdocuments read per get_all with --deep
+UNKNOWN_DATE = "Unknown"     # what extract_date stores when neither the rules nor the model find a date
+DATE_ATTEMPT_FIELD = "date_repaired_from"  # text_sha256 a repair last asked the model for the date of
+REPAIR_SCAN_FIELDS = SCAN_FIELDS + [DATE_ATTEMPT_FIELD]
+
+def find_defects(bill, analysis=None):
+    """Return {field: problem} for a bill's stored enrichment.
+
+    Descriptions must have 1 to DESCRIPTION_MAX_WORDS words, dates must be ISO and
+    positives/negatives must hold ENTRY_COUNT usable entries. An "Unknown" date
+    is accepted once a repair has asked the model about the same text. With analysis (the
+    bill's analysis subdocument) the entries themselves are checked; without it,
+    only the counts recorded on the main document.
+    """
+    defects = {}
+    words = len((bill.get("description") or "").split())
+    if words == 0 or words > DESCRIPTION_MAX_WORDS:
+        defects["description"] = f"{words} words"
+
+    date = bill.get("date")
+    date_attempted = DATE_ATTEMPT_FIELD in bill and bill[DATE_ATTEMPT_FIELD] == bill.get("text_sha256")
+    if parse_date(str(date or "")) != date and not (date == UNKNOWN_DATE and date_attempted):
+        defects["date"] = f"{date!r} is not a date"
+
+    counts = bill.get("analysis") or {}
+    for key in ANALYSIS_FIELDS:
+        if analysis is not None:
+            entries = analysis.get(key) or []
+            usable = len(usable_entries(entries))
+            if usable < ENTRY_COUNT or usable != len(entries):
+                defects[key] = f"{usable} of {len(entries)} entries usable"
+        elif counts.get(key, 0) < ENTRY_COUNT:
+            defects[key] = f"{counts.get(key, 0)} entries"
+    return defects
+
+def repair_bill(bill, defects, bill_text):
+    """Regenerate only the defective fields of bill, in place, and return the fields to write.
+
+    bill_text is needed unless only a date is reformatted. When the model is
+    asked for a date, the text it was asked about is recorded, so a date it
+    can't find is not asked for again until the text changes.
+    """
+    fields = list(defects)
+    for field in defects:
+        if field == "description":
+            bill["description"] = generate_description(bill_text)
+        elif field == "date":
+            # A date in another format is rewritten as ISO without asking the model
+            bill["date"] = parse_date(str(bill.get("date") or ""))
+            if not bill["date"]:
+                bill["date"] = extract_date(bill_text)
+                bill[DATE_ATTEMPT_FIELD] = bill.get("text_sha256")
+                fields.append(DATE_ATTEMPT_FIELD)
+        else:
+            bill[field] = generate_missing_entries(field, bill_text, usable_entries(bill.get(field)))
+    return fields
+
+def needs_text(bill, defects):
+    return any(field != "date" or not parse_date(str(bill.get("date") or "")) for field in defects)
+
+def load_analyses(db, docs):
+    """Return {doc_id: analysis subdocument} for the given (doc_id, doc_ref) pairs, in batched reads."""
+    analyses = {}
+    refs = [analysis_ref(doc_ref) for _, doc_ref in docs]
+    for start in range(0, len(refs), ANALYSIS_BATCH):
+        for snapshot in db.get_all(refs[start:start + ANALYSIS_BATCH]):
+            analyses[snapshot.reference.parent.parent.id] = snapshot.to_dict() if snapshot.exists else {}
+    return analyses
+
+def commit(batch, repaired):
+    """Commit a batch of repairs and update the listing with repaired descriptions and dates."""
+    throttled_call(FIRESTORE_URL, batch.commit)
+    try:
+        update_listing(repaired)
+    except Exception as e:
+        print(f"Error updating the listing: {str(e)}")
+
+def main():
+    """Find enriched documents with defective fields and regenerate just those fields."""
+    parser = argparse.ArgumentParser(description="Repair defective descriptions, dates, positives and negatives.")
+    parser.add_argument("--deep", action="store_true",
+                        help="Read every analysis subdocument to check the entries, not only their counts")
+    parser.add_argument("--check", action="store_true", help="Report the defects without repairing them")
+    args = parser.parse_args()
+
+    db = get_db()
+    bills_ref = db.collection(CHAMBER)
+    session = create_session()
+
+    # Only documents enrichment considers done; missing and stale fields are save_to_firestore_fields.py's job
+    enriched = []
+    for doc in bills_ref.select(REPAIR_SCAN_FIELDS).stream():
+        bill = doc.to_dict()
+        if "analysis" not in bill:
+            continue
+        if bill.get("text_sha256") and bill.get("enriched_from") != bill["text_sha256"]:
+            continue
+        enriched.append((doc.id, doc.reference, bill))
+
+    analyses = load_analyses(db, [(doc_id, doc_ref) for doc_id, doc_ref, _ in enriched]) if args.deep else {}
+    defective = []
+    fields_found = Counter()
+    for doc_id, doc_ref, bill in enriched:
+        defects = find_defects(bill, analyses.get(doc_id) if args.deep else None)
+        if defects:
+            print(f"Document {doc_id}: " + ", ".join(f"{field} ({problem})" for field, problem in defects.items()))
+            defective.append((doc_id, doc_ref, bill, defects))
+            fields_found.update(defects)
+    print(f"{len(defective)} of {len(enriched)} enriched documents have defects: {dict(fields_found)}")
+    if args.check or not defective:
+        return
+
+    batch, queued, repaired = db.batch(), [], 0
+    for doc_id, doc_ref, bill, defects in defective:
+        if any(field in ANALYSIS_FIELDS for field in defects):
+            if args.deep:
+                bill.update({key: analyses[doc_id].get(key, []) for key in ANALYSIS_FIELDS})
+            else:
+                load_analysis(doc_ref, bill)
+
+        bill_text = ""
+        if needs_text(bill, defects):
+            text_content = fetch_text_from_url(session, bill.get("text_url")) if bill.get("text_url") else None
+            if not text_content:
+                print(f"Failed to fetch text for document {doc_id}, skipping.")
+                continue
+            bill_text = clean_text(text_content)
+
+        fields = repair_bill(bill, defects, bill_text)
+        stage_repair(batch, doc_ref, bill, fields)
+        queued.append((doc_id, bill))
+        print(f"Document {doc_id} repaired: {', '.join(defects)}")
+
+        if len(queued) >= BATCH_SIZE:
+            commit(batch, queued)
+            repaired += len(queued)
+            batch, queued = db.batch(), []
+
+    if queued:
+        commit(batch, queued)
+        repaired += len(queued)
+
+    print(f"Repaired {repaired} documents.")
+    print_model_usage()
+    save_model_usage()
+
+if __name__ == "__main__":
+    main()
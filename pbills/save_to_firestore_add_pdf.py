@@ -1,37 +1,16 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
 import os
-import json
 import random
 import string
-import requests
 from urllib.parse import urlparse
-import time
-from requests.adapters import HTTPAdapter
-from urllib3 import Retry
+from fingerprints import load_fingerprints, save_fingerprints, record_stage, stage_is_current
+from checkpoint import iter_jsonl, clear_jsonl
+from search_index import open_index, set_doc_id
+from firebase_client import get_db, get_bucket
+from listing import update_listing
+from throttle import throttled_call, STORAGE_URL, FIRESTORE_URL
+from download import cached_pdf, download_to_file, discard
 
-# Load environment variables
-# load_dotenv()  # Uncomment if you're using a .env file locally
-
-# Initialize Firebase Admin SDK with credentials from the environment variable
-firebase_credentials = os.getenv('FIREBASE_CREDENTIALS')  # This should be the entire JSON string
-if firebase_credentials is None:
-    raise ValueError("FIREBASE_CREDENTIALS environment variable is not set.")
-
-# Parse the JSON string into a dictionary
-cred_dict = json.loads(firebase_credentials)
-cred = credentials.Certificate(cred_dict)
-firebase_admin.initialize_app(cred, {"storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET')})
-
-# Get Firestore client
-db = firestore.client()
-
-# Get Storage bucket
-bucket = storage.bucket()
-
-# Load JSON data
-with open("pbills/parliament-bills.json", "r", encoding="utf-8") as file:
-    data = json.load(file)
+INPUT_PATH = "pbills/parliament-bills.jsonl"
 
 def generate_unique_id():
     prefix = "pbill_"
@@ -39,73 +18,124 @@ def generate_unique_id():
     random_part = "".join(random.choice(alphanumeric) for _ in range(21))
     return prefix + random_part
 
-def create_session():
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
-    session.mount("http://", HTTPAdapter(max_retries=retries))
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    return session
-
-def upload_pdf_to_storage(session, pdf_url, file_name):
+def upload_pdf_to_storage(pdf_url, file_name, content_sha256=None):
+    """Upload a bill's PDF from the download cache (fetching it again only if extraction didn't leave it there)."""
     try:
-        # Download the PDF
-        response = session.get(pdf_url, timeout=30)
-        response.raise_for_status()
+        pdf_path = cached_pdf(pdf_url, content_sha256) or download_to_file(pdf_url)[0]
 
-        # Upload to Firebase Storage
-        blob = bucket.blob(f"pbills/{file_name}")
-        blob.upload_from_string(response.content, content_type="application/pdf")
+        # Upload to Firebase Storage, streaming from the file
+        blob = get_bucket().blob(f"pbills/{file_name}")
+        throttled_call(STORAGE_URL, blob.upload_from_filename, pdf_path, content_type="application/pdf")
+        discard(pdf_path)
 
         # Make the blob publicly accessible
-        blob.make_public()
+        throttled_call(STORAGE_URL, blob.make_public)
 
         return blob.public_url
-    except requests.exceptions.RequestException as e:
+    except OSError as e:
         print(f"Error downloading or uploading PDF from {pdf_url}: {str(e)}")
         return None
 
-# Create a session for reuse
-session = create_session()
-
-# Iterate through data and save to Firestore
-for index, item in enumerate(data):
-    # Generate a unique ID for each document
-    doc_id = generate_unique_id()
-
-    # Handle PDF
-    if "pdf_url" in item:
-        pdf_file_name = os.path.basename(urlparse(item["pdf_url"]).path)
-        storage_pdf_url = upload_pdf_to_storage(session, item["pdf_url"], doc_id)
-        if storage_pdf_url:
-            item["pdf_url"] = storage_pdf_url
-        else:
-            print(f"Failed to upload PDF for document {doc_id}")
-
-    # Handle large text content
-    if "text" in item:
-        text_content = item["text"]
-        text_file_name = f"{doc_id}.txt"
-
-        # Upload text content to Firebase Storage
-        text_blob = bucket.blob(f"pbills_text/{text_file_name}")
-        text_blob.upload_from_string(text_content, content_type="text/plain")
-        text_blob.make_public()
-
-        # Replace text content with the storage URL in the item
-        item["text_url"] = text_blob.public_url
-        del item["text"]  # Remove the text content from the main document
-
-    # Get a reference to the document with the generated ID
-    doc_ref = db.collection("pbills").document(doc_id)
-
-    # Set the data for the document
-    doc_ref.set(item)
-
-    print(f"Document added with ID: {doc_id}")
-
-    # Add a delay every 10 requests to avoid overwhelming the server
-    if (index + 1) % 5 == 0:
-        print("Pausing for 2 seconds...")
-        time.sleep(2)
-
-print("All documents have been added to Firestore.")
\ No newline at end of file
+def resolve_duplicate(duplicate_of, fingerprints):
+    """Turn a near-duplicate found during extraction into a reference to its Firestore document."""
+    if duplicate_of["chamber"] == "pbills":
+        chamber_fingerprints = fingerprints
+    else:
+        chamber_fingerprints = load_fingerprints(f"{duplicate_of['chamber']}/fingerprints.json")
+    doc_id = chamber_fingerprints.get(duplicate_of["pdf_url"], {}).get("doc_id")
+    if not doc_id:
+        return None
+    return {"collection": duplicate_of["chamber"], "doc_id": doc_id, "similarity": duplicate_of["similarity"]}
+
+def main():
+    """Upload the extracted bills to Storage and save them as Firestore documents."""
+    # Firebase is initialized here rather than at import time
+    from firebase_admin import firestore
+    db = get_db()
+    bucket = get_bucket()
+
+    # Read the extracted bills lazily, one JSONL record at a time
+    data = iter_jsonl(INPUT_PATH)
+
+    # Fingerprints tell us which listing PDFs already have a document
+    fingerprints = load_fingerprints()
+    search_index = open_index()
+    ingested_urls = set()
+
+    # Iterate through data and save to Firestore
+    for item in data:
+        # Reuse the document of a bill whose PDF was replaced, otherwise generate a unique ID
+        doc_id = item.pop("doc_id", None) or generate_unique_id()
+        source_url = item.get("pdf_url")
+        if source_url:
+            # A bill can appear twice if extraction restarted after writing it, or if a previous
+            # run of this script stopped before clearing the input; save each version only once
+            record = fingerprints.get(source_url, {})
+            if source_url in ingested_urls or stage_is_current(record, "upload", item.get("content_sha256")):
+                print(f"Already saved, skipping: {item.get('title')}")
+                continue
+            ingested_urls.add(source_url)
+            item["source_url"] = source_url
+
+        # Point near-duplicates at the document holding the earlier copy
+        if item.get("duplicate_of"):
+            item["duplicate_of"] = resolve_duplicate(item["duplicate_of"], fingerprints)
+            if not item["duplicate_of"]:
+                del item["duplicate_of"]
+
+        # Handle PDF
+        if "pdf_url" in item:
+            pdf_file_name = os.path.basename(urlparse(item["pdf_url"]).path)
+            storage_pdf_url = upload_pdf_to_storage(item["pdf_url"], doc_id, item.get("content_sha256"))
+            if storage_pdf_url:
+                item["pdf_url"] = storage_pdf_url
+            else:
+                print(f"Failed to upload PDF for document {doc_id}")
+
+        # Handle large text content
+        if "text" in item:
+            text_content = item["text"]
+            text_file_name = f"{doc_id}.txt"
+
+            # Upload text content to Firebase Storage
+            text_blob = bucket.blob(f"pbills_text/{text_file_name}")
+            throttled_call(STORAGE_URL, text_blob.upload_from_string, text_content, content_type="text/plain")
+            throttled_call(STORAGE_URL, text_blob.make_public)
+
+            # Replace text content with the storage URL in the item
+            item["text_url"] = text_blob.public_url
+            del item["text"]  # Remove the text content from the main document
+
+        # New and re-ingested bills wait for the enrichment worker
+        item["status"] = "pending"
+        item["updated_at"] = firestore.SERVER_TIMESTAMP  # lets export.py pick up changed documents
+
+        # Get a reference to the document with the generated ID
+        doc_ref = db.collection("pbills").document(doc_id)
+
+        # Set the data for the document, keeping fields of an existing document that we don't overwrite
+        throttled_call(FIRESTORE_URL, doc_ref.set, item, merge=True)
+
+        print(f"Document added with ID: {doc_id}")
+
+        # Add the bill to the listing pages right away; its description follows from enrichment
+        try:
+            update_listing([(doc_id, item)])
+        except Exception as e:
+            print(f"Error updating the listing for document {doc_id}: {str(e)}")
+
+        # Remember which document holds this PDF, and which content it was built from
+        if source_url:
+            record = fingerprints.setdefault(source_url, {"title": item.get("title")})
+            record["doc_id"] = doc_id
+            record_stage(record, "upload", item.get("content_sha256"), doc_id=doc_id)
+            save_fingerprints(fingerprints)
+            set_doc_id(search_index, source_url, doc_id)
+
+    # Every record has been saved, so the next extraction starts a fresh input file
+    clear_jsonl(INPUT_PATH)
+
+    print("All documents have been added to Firestore.")
+
+if __name__ == "__main__":
+    main()
@@ -1,164 +1,281 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3 import Retry
+import argparse
+import signal
 import time
-import random
-import json
-from google.api_core.exceptions import DeadlineExceeded 
 from dotenv import load_dotenv
-import os
 
 # Load environment variables from .env file
 # load_dotenv()
 
 # Import functions from adding.py
-from adding import generate_description, generate_positives, generate_negatives, extract_date, clean_text
-
-# Load environment variables
-# load_dotenv()  # Uncomment if you're using a .env file locally
-
-# Initialize Firebase Admin SDK with credentials from the environment variable
-firebase_credentials = os.getenv('FIREBASE_CREDENTIALS')  # This should be the entire JSON string
-if firebase_credentials is None:
-    raise ValueError("FIREBASE_CREDENTIALS environment variable is not set.")
-
-# Parse the JSON string into a dictionary
-cred_dict = json.loads(firebase_credentials)
-cred = credentials.Certificate(cred_dict)
-firebase_admin.initialize_app(cred, {"storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET')})
-# Get Firestore client
-db = firestore.client()
-
-# Get Storage bucket
-bucket = storage.bucket()
-
-def create_session():
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
-    session.mount("http://", HTTPAdapter(max_retries=retries))
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    return session
-
-def fetch_text_from_url(session, text_url):
-    try:
-        response = session.get(text_url, timeout=30)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching text from {text_url}: {str(e)}")
-        return None
+from adding import clean_text, process_bill, print_model_usage, save_model_usage, REUSE_SIMILARITY
+from fingerprints import sha256_text
+from prefetch import prefetch
+from firebase_client import get_db
+from throttle import throttled_call, FIRESTORE_URL
+from text_fetch import create_session, fetch_text_from_url
+from scheduling import publication_month, order_by_freshness
+from sharding import parse_shard, in_shard, open_leases
+from enrichment_worker import EnrichmentWorker, PENDING, ENRICHED
+from listing import update_listing
+from analysis import ANALYSIS_FIELDS, load_analysis, stage_enrichment
+
+ENRICHMENT_FIELDS = ["description", "date", "analysis"]
+# Fields enrichment writes to the main document; positives and negatives go to its analysis subdocument
+DOCUMENT_FIELDS = ["description", "date", "analysis", "enriched_from", "status"]
+# Fields a scan reads: enough to decide, order and enrich. Inline positives/negatives exist only before migration
+SCAN_FIELDS = ENRICHMENT_FIELDS + ANALYSIS_FIELDS + [
+    "title", "text_url", "text_sha256", "enriched_from", "source_url", "page_count", "duplicate_of", "status",
+]
 
-def load_last_processed(file_name):
-    try:
-        with open(file_name, 'r') as file:
-            data = json.load(file)
-            return data.get('last_processed_doc')
-    except FileNotFoundError:
+def load_duplicate_source(bill):
+    """Load the enriched document of a near-duplicate bill, if it is similar enough to reuse."""
+    duplicate_of = bill.get("duplicate_of")
+    if not duplicate_of or duplicate_of.get("similarity", 0) < REUSE_SIMILARITY:
+        return None
+    source = get_db().collection(duplicate_of["collection"]).document(duplicate_of["doc_id"]).get()
+    if not source.exists:
         return None
+    print(f"Reusing enrichment from near-duplicate document {duplicate_of['doc_id']}")
+    return load_analysis(source.reference, source.to_dict())
 
-def save_last_processed(doc_id, file_name):
-    with open(file_name, 'w') as file:
-        json.dump({'last_processed_doc': doc_id}, file)
-
-# Create a session for reuse
-session = create_session()
-
-# Fetch the sbills collection
-sbills_ref = db.collection('pbills')
-last_processed_doc = load_last_processed('pbills/last_processed_pbills.json')
-sbills_docs = sbills_ref.stream()
-
-# Process documents in batches
-batch_size = 10
-docs_processed = 0
-docs_to_update = []
-start_processing = last_processed_doc is None
-
-print(f"Starting processing from document: {last_processed_doc}")
-
-while True:
-    try:
-        for doc in sbills_docs:
-            print(f"Checking document: {doc.id}")
-
-            if not start_processing and doc.id == last_processed_doc:
-                start_processing = True
-                print(f"Resuming processing after last processed document: {last_processed_doc}")
-                continue
-            
-            if not start_processing:
-                print(f"Skipping document: {doc.id}")
-                continue
-            
-            doc_id = doc.id
-            bill = doc.to_dict()
+def needs_enrichment(bill):
+    """Drop enrichment computed from an older version of the text, and report whether any field is missing.
 
-            print(f"Processing document: {doc_id}")
+    A bill that was never enriched has no enriched_from; the date extraction stored on it is kept.
+    The analysis counts mark an attempt: short or empty lists are left to repair.py rather than
+    being regenerated (and escalated) on every run.
+    """
+    text_sha256 = bill.get("text_sha256")
+    if text_sha256 and bill.get("enriched_from") and bill["enriched_from"] != text_sha256:
+        for key in ENRICHMENT_FIELDS + ANALYSIS_FIELDS:
+            bill.pop(key, None)
+    return not all(key in bill for key in ENRICHMENT_FIELDS)
+
+def enrich_bill(doc_ref, bill, text_content, cleaned_text):
+    """Generate a bill's description, positives, negatives and date in place and mark it enriched."""
+    # Positives/negatives already stored aren't generated again; padding placeholders don't count
+    load_analysis(doc_ref, bill)
+
+    # Reuse the enrichment of a near-duplicate bill where there is one
+    bill["text"] = cleaned_text
+    process_bill(bill, load_duplicate_source(bill))
+    del bill["text"]
+
+    # Record which text the enrichment was computed from
+    bill["enriched_from"] = bill.get("text_sha256") or sha256_text(text_content)
+    bill["status"] = ENRICHED
+
+def enrichment_month(bill):
+    """Recency key of a document: its upload month, or the month of its extracted date."""
+    return publication_month(bill.get("source_url")) or (bill.get("date") or "")[:7]
+
+def main():
+    """Enrich documents that are missing a description, positives, negatives or date."""
+    parser = argparse.ArgumentParser(description="Enrich bill documents with GPT.")
+    parser.add_argument("--shard", type=parse_shard, help="Only enrich documents whose pdf_url hashes to shard i of N (i/N)")
+    parser.add_argument("--leases", choices=["firestore", "local"],
+                        help="Claim each document with an expiring lease, so several workers can share the backlog")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and enrich each document as soon as it is ingested")
+    parser.add_argument("--workers", type=int, default=2, help="Documents enriched at once with --watch")
+    args = parser.parse_args()
+
+    # Create a session for reuse
+    session = create_session()
+
+    # Firebase is initialized here rather than at import time
+    from google.api_core.exceptions import DeadlineExceeded
+    db = get_db()
 
-            # Only proceed if description, positives, negatives, or date are missing
-            if not all(key in bill for key in ["description", "positives", "negatives", "date"]):
-                text_url = bill.get("text_url")
-                if text_url:
-                    # Fetch the text from the URL
-                    text_content = fetch_text_from_url(session, text_url)
-                    
-                    if text_content:
-                        # Clean the text
-                        cleaned_text = clean_text(text_content)
-                        
-                        # Generate description, positives, and negatives using OpenAI's GPT model
-                        if "description" not in bill:
-                            bill["description"] = generate_description(cleaned_text)
-                        if "positives" not in bill:
-                            bill["positives"] = generate_positives(cleaned_text)
-                        if "negatives" not in bill:
-                            bill["negatives"] = generate_negatives(cleaned_text)
-                        
-                        # Extract a relevant date
-                        if "date" not in bill:
-                            bill["date"] = extract_date(cleaned_text)
-                        
-                        # Add to batch update list
-                        docs_to_update.append((doc_id, bill))
-                        docs_processed += 1
-
-                        print(f"Document {doc_id} queued for update.")
-                        
-                        # Check if we've reached the batch size
-                        if docs_processed >= batch_size:
-                            # Perform the updates
-                            for doc_id, updated_bill in docs_to_update:
-                                sbills_ref.document(doc_id).update(updated_bill)
-                                print(f"Document {doc_id} updated with new fields.")
-                                save_last_processed(doc_id, 'last_processed_pbills.json')
-                            
-                            # Reset for next batch
-                            docs_to_update = []
-                            docs_processed = 0
-                            
-                            # Sleep to prevent overwhelming servers
-                            sleep_time = random.uniform(2, 5)
-                            print(f"Sleeping for {sleep_time} seconds...")
-                            time.sleep(sleep_time)
+    # Fetch the pbills collection
+    sbills_ref = db.collection('pbills')
+
+    # A crashed worker's leases expire and its documents are picked up by the others
+    leases = open_leases(args.leases)
+
+    # Process documents in batches
+    batch_size = 10
+    docs_processed = 0
+    docs_to_update = []
+
+    # Text of the next bills is downloaded and cleaned while the current bill is with GPT
+    prefetch_depth = 4
+    prefetch_max_bytes = 32 * 1024 * 1024
+
+    def pending_documents():
+        """Return (doc_id, bill) for documents that still need enrichment, newest and longest first.
+
+        Documents that already have every field are skipped, so an interrupted run
+        resumes where it stopped. The stream restarts on deadline errors.
+        """
+        pending = {}
+        while True:
+            try:
+                for doc in sbills_ref.select(SCAN_FIELDS).stream():
+                    print(f"Checking document: {doc.id}")
+
+                    if doc.id in pending:
+                        continue
+
+                    doc_id = doc.id
+                    bill = doc.to_dict()
+                    if not in_shard(bill.get("source_url") or doc_id, args.shard):
+                        continue
+
+                    # Only proceed if description, positives, negatives, or date are missing (or stale)
+                    if not needs_enrichment(bill):
+                        print(f"Document {doc_id} already has all fields.")
+                    elif not bill.get("text_url"):
+                        print(f"No text URL found for document {doc_id}.")
                     else:
-                        print(f"Failed to fetch text for document {doc_id}.")
-                else:
-                    print(f"No text URL found for document {doc_id}.")
-            else:
-                print(f"Document {doc_id} already has all fields.")
-        
-        # Perform updates for any remaining documents
+                        pending[doc_id] = bill
+                break
+            except DeadlineExceeded as e:
+                print("Deadline exceeded. Retrying...")
+                time.sleep(5)
+
+        print(f"{len(pending)} documents need enrichment")
+        return order_by_freshness(
+            list(pending.items()),
+            lambda item: enrichment_month(item[1]),
+            lambda item: item[1].get("page_count", 0),
+        )
+
+    def fetch_document_text(item):
+        """Fetch and clean a document's text. Returns ((doc_id, bill, text, cleaned_text), size) or None."""
+        doc_id, bill = item
+        if leases:
+            if not leases.acquire(doc_id):
+                print(f"Document {doc_id} is leased by another worker, skipping.")
+                return None
+            # Another worker may have enriched it since the collection was read
+            current = sbills_ref.document(doc_id).get()
+            bill = current.to_dict() if current.exists else {}
+            if not needs_enrichment(bill) or not bill.get("text_url"):
+                leases.release(doc_id)
+                return None
+
+        text_content = fetch_text_from_url(session, bill["text_url"])
+        if not text_content:
+            print(f"Failed to fetch text for document {doc_id}.")
+            if leases:
+                leases.release(doc_id)
+            return None
+        cleaned_text = clean_text(text_content)
+        return (doc_id, bill, text_content, cleaned_text), len(text_content) + len(cleaned_text)
+
+    def refresh_listing(docs):
+        """Update the listing pages with new descriptions and dates, in one transaction per batch."""
+        try:
+            update_listing(docs)
+        except Exception as e:
+            print(f"Error updating the listing: {str(e)}")
+
+    def update_documents(docs_to_update):
+        """Write a batch of enriched documents and their analysis subdocuments to Firestore in one commit."""
+        if not docs_to_update:
+            return
+        batch = db.batch()
+        for doc_id, updated_bill in docs_to_update:
+            stage_enrichment(batch, sbills_ref.document(doc_id), updated_bill, DOCUMENT_FIELDS)
+        throttled_call(FIRESTORE_URL, batch.commit)
         for doc_id, updated_bill in docs_to_update:
-            sbills_ref.document(doc_id).update(updated_bill)
             print(f"Document {doc_id} updated with new fields.")
-            save_last_processed(doc_id, 'last_processed_pbills.json')
-        
-        print("All documents have been processed and updated.")
-        break
-    except DeadlineExceeded as e:
-        print("Deadline exceeded. Retrying...")
-        time.sleep(5)
-        sbills_docs = sbills_ref.stream() 
-        continue
+            if leases:
+                leases.release(doc_id)
+        refresh_listing(docs_to_update)
+
+    def enrich_document(doc_id):
+        """Enrich one document for --watch. It is read again, as it may have changed while queued."""
+        if leases and not leases.acquire(doc_id):
+            print(f"Document {doc_id} is leased by another worker, skipping.")
+            return False
+        try:
+            doc_ref = sbills_ref.document(doc_id)
+            current = doc_ref.get()
+            bill = current.to_dict() if current.exists else None
+            if not bill or not bill.get("text_url"):
+                return False
+            if not needs_enrichment(bill):
+                from firebase_admin import firestore
+                throttled_call(FIRESTORE_URL, doc_ref.update, {"status": ENRICHED, "updated_at": firestore.SERVER_TIMESTAMP})
+                return False
+
+            text_content = fetch_text_from_url(session, bill["text_url"])
+            if not text_content:
+                print(f"Failed to fetch text for document {doc_id}.")
+                return False
+            print(f"Processing document: {doc_id}")
+            enrich_bill(doc_ref, bill, text_content, clean_text(text_content))
+            batch = db.batch()
+            stage_enrichment(batch, doc_ref, bill, DOCUMENT_FIELDS)
+            throttled_call(FIRESTORE_URL, batch.commit)
+            refresh_listing([(doc_id, bill)])
+            return True
+        finally:
+            if leases:
+                leases.release(doc_id)
+
+    def schedule(items):
+        """Order documents from a snapshot like a batch run, keeping only this worker's shard."""
+        items = [item for item in items if in_shard(item[1].get("source_url") or item[0], args.shard)]
+        return order_by_freshness(
+            items, lambda item: enrichment_month(item[1]), lambda item: item[1].get("page_count", 0))
+
+    if args.watch:
+        worker = EnrichmentWorker(
+            sbills_ref.where("status", "==", PENDING), enrich_document, schedule, args.workers)
+
+        def drain(signum, frame):
+            if worker.stopping.is_set():
+                raise KeyboardInterrupt  # a second signal stops without waiting
+            print("Signal received, draining. Send it again to stop immediately.")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, drain)
+        signal.signal(signal.SIGTERM, drain)
+        worker.run()
+
+        if leases:
+            leases.close()
+        print_model_usage()
+        save_model_usage()
+        return
+
+    for doc_id, bill, text_content, cleaned_text in prefetch(
+        pending_documents(), fetch_document_text, prefetch_depth, prefetch_max_bytes
+    ):
+        print(f"Processing document: {doc_id}")
+
+        # Generate description, positives, negatives and date using OpenAI's GPT model
+        enrich_bill(sbills_ref.document(doc_id), bill, text_content, cleaned_text)
+
+        # Add to batch update list
+        docs_to_update.append((doc_id, bill))
+        docs_processed += 1
+
+        print(f"Document {doc_id} queued for update.")
+
+        # Check if we've reached the batch size
+        if docs_processed >= batch_size:
+            # Perform the updates
+            update_documents(docs_to_update)
+
+            # Reset for next batch
+            docs_to_update = []
+            docs_processed = 0
+
+    # Perform updates for any remaining documents
+    update_documents(docs_to_update)
+
+    if leases:
+        leases.close()
+
+    # Report what each model tier cost this run
+    print_model_usage()
+    save_model_usage()
+
+    print("All documents have been processed and updated.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import re
+
+# parliament.go.ke files uploads by month: /sites/default/files/2024-08/<name>.pdf
+UPLOAD_MONTH = re.compile(r"/files/(\d{4})-(\d{2})/")
+
+def publication_month(pdf_url):
+    """Return the "YYYY-MM" upload month in a parliament.go.ke file URL, or "" if it has none."""
+    match = UPLOAD_MONTH.search(pdf_url or "")
+    return f"{match[1]}-{match[2]}" if match else ""
+
+def content_length(validators):
+    """Return the Content-Length from probed validators as an int, or 0 if unknown."""
+    value = (validators or {}).get("content_length")
+    return int(value) if value and str(value).isdigit() else 0
+
+def order_by_freshness(items, month, cost):
+    """Order work newest month first and, within a month, most expensive first.
+
+    month(item) returns a sortable recency key such as "2024-08" ("" sorts
+    last) and cost(item) a size estimate. Recent bills are published soonest,
+    and starting the longest jobs of each month first keeps a large bill from
+    being the last thing running. Ties keep their input (listing) order.
+    """
+    return sorted(items, key=lambda item: (month(item), cost(item)), reverse=True)
@@ -1,7 +1,8 @@
 import requests
 from bs4 import BeautifulSoup
 import json
-import time
+from concurrent.futures import ThreadPoolExecutor
+from throttle import limiter_for, throttled_get, MAX_LIMIT
 import os
 
 BASE_URL = "http://parliament.go.ke"
@@ -35,27 +36,37 @@ def document_exists(document, existing_documents):
             return True
     return False
 
+def fetch_page_rows(page):
+    """Fetch one listing page through the host's adaptive limiter. Returns its table rows, or None on failure."""
+    try:
+        response = throttled_get(requests.get, f"{DOCUMENT_LIST_URL}?page={page}", timeout=30)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to retrieve page {page}: {str(e)}")
+        return None
+    if response.status_code != 200:
+        print(f"Failed to retrieve page {page}")
+        return None
+    soup = BeautifulSoup(response.content, "html.parser")
+    return soup.find_all("tr")
+
 def get_document_list(existing_documents):
     """Fetch the list of documents from the website and check if they exist."""
     document_list = []
     page = 0
-    while True:
-        response = requests.get(f"{DOCUMENT_LIST_URL}?page={page}")
-        if response.status_code != 200:
-            print(f"Failed to retrieve page {page}")
-            break
-        soup = BeautifulSoup(response.content, "html.parser")
-        rows = soup.find_all("tr")
-        if not rows:
-            break
-        for row in rows:
-            document_data = extract_document_data(row)
-            if not document_exists(document_data, existing_documents):
-                document_list.append(document_data)
-        print(f"Scraped page {page} of documents")
-        page += 1
-        time.sleep(2)  # Be polite and avoid overwhelming the server
-    return document_list
+    limiter = limiter_for(DOCUMENT_LIST_URL)
+    with ThreadPoolExecutor(max_workers=MAX_LIMIT) as executor:
+        while True:
+            # Fetch as many pages at once as the limiter currently allows
+            pages = list(range(page, page + int(limiter.limit)))
+            for page, rows in zip(pages, executor.map(fetch_page_rows, pages)):
+                if not rows:
+                    return document_list
+                for row in rows:
+                    document_data = extract_document_data(row)
+                    if not document_exists(document_data, existing_documents):
+                        document_list.append(document_data)
+                print(f"Scraped page {page} of documents")
+            page += 1
 
 def main():
     """Main function to fetch and save the document list."""
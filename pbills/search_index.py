@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import sys
+import time
+
+CHAMBER = "pbills"
+INDEX_PATH = "pbills/search_index.db"
+
+# Every chamber keeps its own index; queries read all of them
+INDEX_PATHS = {
+    "pbills": "pbills/search_index.db",
+    "sbills": "sbills/search_index.db",
+}
+
+SNIPPET_TOKENS = 16
+
+def open_index(path=INDEX_PATH):
+    """Open (and create if needed) the full-text index for this chamber."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY,
+            pdf_url TEXT UNIQUE NOT NULL,
+            chamber TEXT NOT NULL,
+            title TEXT,
+            doc_id TEXT,
+            text_sha256 TEXT,
+            indexed_at REAL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS bills_fts USING fts5(
+            title, text, tokenize = 'porter unicode61'
+        );
+    """)
+    return conn
+
+def index_bill(conn, bill, chamber=CHAMBER):
+    """Add or refresh one bill in the index. Unchanged text (same text_sha256) is skipped."""
+    text = bill.get("text", "")
+    if not text:
+        return False
+
+    row = conn.execute(
+        "SELECT id, text_sha256 FROM bills WHERE pdf_url = ?", (bill["pdf_url"],)
+    ).fetchone()
+    if row and row[1] and row[1] == bill.get("text_sha256"):
+        return False
+
+    with conn:
+        if row:
+            bill_id = row[0]
+            conn.execute(
+                "UPDATE bills SET title = ?, text_sha256 = ?, indexed_at = ? WHERE id = ?",
+                (bill.get("title"), bill.get("text_sha256"), time.time(), bill_id),
+            )
+            conn.execute("DELETE FROM bills_fts WHERE rowid = ?", (bill_id,))
+        else:
+            bill_id = conn.execute(
+                "INSERT INTO bills (pdf_url, chamber, title, doc_id, text_sha256, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (bill["pdf_url"], chamber, bill.get("title"), bill.get("doc_id"), bill.get("text_sha256"), time.time()),
+            ).lastrowid
+        conn.execute(
+            "INSERT INTO bills_fts (rowid, title, text) VALUES (?, ?, ?)",
+            (bill_id, bill.get("title", ""), text),
+        )
+    return True
+
+def set_doc_id(conn, pdf_url, doc_id):
+    """Record the Firestore document a bill was saved under."""
+    with conn:
+        conn.execute("UPDATE bills SET doc_id = ? WHERE pdf_url = ?", (doc_id, pdf_url))
+
+def to_fts_query(query):
+    """Turn free text into an FTS5 query that matches all words, ignoring FTS syntax characters."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return " ".join(terms)
+
+def search(query, limit=10, index_paths=None):
+    """Search bills in every chamber's index. Returns the best matches by BM25 rank.
+
+    Each result is a dict with chamber, doc_id, pdf_url, title, snippet and score
+    (lower is better). Scores come from separate per-chamber indexes, so they are
+    comparable only approximately across chambers.
+    """
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return []
+
+    results = []
+    for chamber, path in (index_paths or INDEX_PATHS).items():
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT b.doc_id, b.pdf_url, b.title,
+                       snippet(bills_fts, 1, '[', ']', '...', {SNIPPET_TOKENS}),
+                       bm25(bills_fts, 5.0, 1.0) AS score
+                FROM bills_fts JOIN bills b ON b.id = bills_fts.rowid
+                WHERE bills_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (fts_query, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        for doc_id, pdf_url, title, snippet, score in rows:
+            results.append({
+                "chamber": chamber,
+                "doc_id": doc_id,
+                "pdf_url": pdf_url,
+                "title": title,
+                "snippet": snippet,
+                "score": score,
+            })
+
+    results.sort(key=lambda result: result["score"])
+    return results[:limit]
+
+def load_corpus(index_paths=None):
+    """Return every indexed bill in every chamber as dicts with chamber, pdf_url, doc_id, title, text_sha256 and text."""
+    corpus = []
+    for chamber, path in (index_paths or INDEX_PATHS).items():
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                """
+                SELECT b.pdf_url, b.doc_id, b.title, b.text_sha256, bills_fts.text
+                FROM bills b JOIN bills_fts ON bills_fts.rowid = b.id
+                ORDER BY b.id
+                """
+            ).fetchall()
+        finally:
+            conn.close()
+        for pdf_url, doc_id, title, text_sha256, text in rows:
+            corpus.append({
+                "chamber": chamber,
+                "pdf_url": pdf_url,
+                "doc_id": doc_id,
+                "title": title,
+                "text_sha256": text_sha256,
+                "text": text,
+            })
+    return corpus
+
+def main():
+    """Search the index from the command line: python pbills/search_index.py <words>."""
+    query = " ".join(sys.argv[1:])
+    start = time.perf_counter()
+    results = search(query)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for result in results:
+        print(f"[{result['chamber']}] {result['title']} ({result['doc_id'] or result['pdf_url']})")
+        print(f"    {' '.join(result['snippet'].split())}")
+    print(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MIB = 1024 * 1024
+DEFAULT_BUDGET_SHARE = 0.6   # share of the machine's memory OCR may reserve when no budget is configured
+FALLBACK_BUDGET_MB = 2048    # used when /proc/meminfo can't be read
+CORRECTION_WEIGHT = 0.3      # EWMA weight of each new measured/estimated ratio
+MAX_WAIT_SECONDS = 60        # after this long, a waiting bill stops smaller bills from backfilling past it
+SAMPLE_INTERVAL = 0.05       # seconds between RSS samples while a job runs
+
+def read_proc_status(field):
+    """Return a memory field (e.g. VmRSS, VmHWM) of /proc/self/status in bytes, or None where unavailable."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def children_peak():
+    """Return the largest RSS of any child process reaped so far, in bytes, or 0 where unavailable.
+
+    This covers OCR worker processes and the tesseract processes they ran.
+    It is a high-water mark over the whole run, not only the current job.
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024  # ru_maxrss is in KB on Linux
+
+class MemorySampler:
+    """Sample this process's RSS on a thread while a job runs, keeping the largest growth over its start.
+
+    Jobs running side by side grow the same process, so a job's growth can
+    include some of theirs; that errs toward larger estimates, which is the
+    safe direction for admission.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.baseline = None
+        self.highest = None
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _sample(self):
+        rss = read_proc_status("VmRSS")
+        if rss is not None:
+            self.highest = rss if self.highest is None else max(self.highest, rss)
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.baseline = read_proc_status("VmRSS")
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.thread.join()
+        self._sample()
+
+    @property
+    def peak(self):
+        """Bytes the process grew by at most while the job ran, or 0 where RSS can't be read."""
+        if self.baseline is None or self.highest is None:
+            return 0
+        return max(0, self.highest - self.baseline)
+
+def memory_budget():
+    """Return the OCR memory budget in bytes from OCR_MEMORY_BUDGET_MB, or a share of total memory."""
+    configured = os.getenv("OCR_MEMORY_BUDGET_MB")
+    if configured:
+        return int(float(configured) * MIB)
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(int(line.split()[1]) * 1024 * DEFAULT_BUDGET_SHARE)
+    except OSError:
+        pass
+    return FALLBACK_BUDGET_MB * MIB
+
+class _Waiter:
+    def __init__(self, reservation):
+        self.reservation = reservation
+        self.arrived = time.monotonic()
+
+class MemoryAdmission:
+    """Admit OCR jobs while their estimated memory fits in a budget.
+
+    Any waiting job that fits the free headroom may start, so small bills
+    backfill around a large one, unless the oldest waiter has been held for
+    MAX_WAIT_SECONDS, in which case headroom is kept for it. A job larger than
+    the whole budget runs on its own. Estimates are scaled by a correction
+    factor learned from the peaks measured by observe().
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.reserved = 0
+        self.in_flight = 0
+        self.correction = 1.0
+        self.peak_reserved = 0
+        self.waiting = []
+        self.condition = threading.Condition()
+
+    def _fits(self, waiter):
+        oldest = self.waiting[0]
+        if oldest is not waiter and time.monotonic() - oldest.arrived >= MAX_WAIT_SECONDS:
+            return False  # keep the headroom for the job that has waited longest
+        if self.in_flight == 0:
+            return True
+        return self.reserved + waiter.reservation <= self.budget
+
+    @contextmanager
+    def admit(self, estimate):
+        """Hold a reservation for a job estimated to need estimate bytes (before correction)."""
+        with self.condition:
+            waiter = _Waiter(int(estimate * self.correction))
+            self.waiting.append(waiter)
+            while not self._fits(waiter):
+                self.condition.wait(timeout=1.0)
+            self.waiting.remove(waiter)
+            self.reserved += waiter.reservation
+            self.in_flight += 1
+            self.peak_reserved = max(self.peak_reserved, self.reserved)
+        try:
+            yield waiter.reservation
+        finally:
+            with self.condition:
+                self.reserved -= waiter.reservation
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def observe(self, estimate, peak):
+        """Fold a job's measured peak into the correction factor applied to later estimates."""
+        if estimate <= 0 or peak <= 0:
+            return
+        with self.condition:
+            self.correction += CORRECTION_WEIGHT * (peak / estimate - self.correction)
@@ -0,0 +1,121 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from fingerprints import validators_from_headers
+from throttle import limiter_for, RETRYABLE_STATUSES
+
+# Downloaded PDFs are kept here between extraction and upload (both run on the same runner)
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "bills-pdf-cache")
+CHUNK_SIZE = 256 * 1024
+
+def cache_path(pdf_url):
+    """Return the cache file path for a PDF URL."""
+    return os.path.join(CACHE_DIR, hashlib.sha1(pdf_url.encode("utf-8")).hexdigest() + ".pdf")
+
+def sha256_file(path):
+    """Hash a file through a read-only memory map, without reading it into a bytes object."""
+    if os.path.getsize(path) == 0:
+        return hashlib.sha256(b"").hexdigest()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return hashlib.sha256(mapped).hexdigest()
+
+def range_validator(validators):
+    """The validator to send in If-Range: a strong ETag, else Last-Modified, else None."""
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+def _stream_to_file(pdf_url, partial_path, timeout, known):
+    """Fetch pdf_url into partial_path, continuing from the bytes already there. Returns the validators.
+
+    known holds the validators of the copy the bytes on disk came from, and is
+    filled from the first response. A resume sends them in If-Range, so a copy
+    that changed in between is sent whole instead of appended to the old bytes.
+    """
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    if_range = range_validator(known)
+    if offset and not if_range:
+        offset = 0  # Nothing ties the bytes on disk to the server's current copy
+    headers = {"Range": f"bytes={offset}-", "If-Range": if_range} if offset else {}
+
+    with urlopen(Request(pdf_url, headers=headers), timeout=timeout) as response:
+        validators = validators_from_headers(response.headers)
+        if offset and response.status != 206:
+            offset = 0  # The copy changed, or the server ignored the Range header: it is sending the whole file
+        elif offset and range_validator(validators) != if_range:
+            # A server that ignores If-Range sent the rest of another copy
+            os.remove(partial_path)
+            known.clear()
+            raise ConnectionError(f"{pdf_url} changed during the download, starting again")
+        known.clear()
+        known.update(validators)
+        if offset:
+            # A partial response's Content-Length covers only the remaining bytes; the full size is in Content-Range
+            validators["content_length"] = response.headers.get("Content-Range", "").rpartition("/")[2] or None
+
+        with open(partial_path, "ab" if offset else "wb") as f:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+            received = f.tell()
+
+    # urllib returns a short body without raising when the connection drops
+    expected = validators["content_length"]
+    if expected and expected.isdigit() and received < int(expected):
+        raise ConnectionError(f"connection closed after {received} of {expected} bytes")
+    return validators
+
+def download_to_file(pdf_url, path=None, retries=3, timeout=60):
+    """Stream a PDF to disk in chunks through the host's limiter. Returns (path, sha256, validators).
+
+    A dropped connection resumes from the bytes already on disk with an HTTP
+    Range request, instead of starting again from zero, as long as the server's
+    copy is still the one they came from.
+    """
+    path = path or cache_path(pdf_url)
+    partial_path = path + ".part"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    limiter = limiter_for(pdf_url)
+    known = {}  # validators of the copy being downloaded; a .part left by an earlier run has none
+
+    for attempt in range(retries + 1):
+        try:
+            with limiter.slot() as slot:
+                try:
+                    validators = _stream_to_file(pdf_url, partial_path, timeout, known)
+                except HTTPError as e:
+                    slot.record(e.code, e.headers.get("Retry-After"))
+                    raise
+            os.replace(partial_path, path)
+            return path, sha256_file(path), validators
+        except HTTPError as e:
+            if e.code == 416:
+                os.remove(partial_path)  # Our partial file no longer fits the server's copy
+            if (e.code != 416 and e.code not in RETRYABLE_STATUSES) or attempt == retries:
+                raise
+        except OSError as e:
+            if attempt == retries:
+                raise
+            print(f"Download of {pdf_url} interrupted ({e}), resuming")
+
+def cached_pdf(pdf_url, content_sha256=None):
+    """Return the cached file for pdf_url if it exists (and matches content_sha256 when given)."""
+    path = cache_path(pdf_url)
+    if not os.path.exists(path):
+        return None
+    if content_sha256 and sha256_file(path) != content_sha256:
+        return None
+    return path
+
+def discard(path):
+    """Remove a cached PDF once no later stage needs it."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
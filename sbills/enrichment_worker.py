@@ -0,0 +1,109 @@
+import queue
+import threading
+from datetime import datetime, timezone
+
+PENDING = "pending"          # status written by save_to_firestore_add_pdf.py
+ENRICHED = "enriched"        # status written once a document has every enrichment field
+
+class EnrichmentWorker:
+    """Enrich documents as soon as they are written, by listening to the pending-status query.
+
+    on_snapshot delivers every document pending when the worker starts, then
+    each one ingested (or re-ingested) after. A document is queued once: it
+    isn't queued again while it waits or is being enriched, and one that
+    changes while it is being enriched is queued again afterwards so the newer
+    text is used. stop() stops listening and lets the enrichments in progress
+    finish; documents still queued stay pending for the next worker or run.
+    """
+
+    def __init__(self, query, enrich, schedule, workers=2):
+        self.query = query
+        self.enrich = enrich        # enrich(doc_id) reads, enriches and writes one document
+        self.schedule = schedule    # schedule([(doc_id, bill)]) returns the items to queue, in order
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.queued = set()
+        self.running = set()
+        self.changed = set()
+        self.written_at = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.enriched = 0
+        self.failed = 0
+
+    def submit(self, doc_id, written_at=None):
+        """Queue a document unless it is already queued; mark it for another pass if it is being enriched."""
+        with self.lock:
+            if doc_id in self.running:
+                self.changed.add(doc_id)
+                return
+            if doc_id in self.queued:
+                return
+            self.queued.add(doc_id)
+            self.written_at[doc_id] = written_at
+        self.queue.put(doc_id)
+
+    def on_snapshot(self, snapshots, changes, read_time):
+        """Called on Firestore's listener thread: queue added and modified documents, then return."""
+        items = [
+            (change.document.id, change.document.to_dict())
+            for change in changes
+            if change.type.name in ("ADDED", "MODIFIED")
+        ]
+        written = {change.document.id: change.document.update_time for change in changes}
+        for doc_id, _ in self.schedule(items):
+            self.submit(doc_id, written.get(doc_id))
+
+    def _work(self):
+        while not self.stopping.is_set():
+            try:
+                doc_id = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if self.stopping.is_set():
+                break  # left pending in Firestore
+
+            with self.lock:
+                self.queued.discard(doc_id)
+                self.running.add(doc_id)
+                written_at = self.written_at.pop(doc_id, None)
+
+            try:
+                if self.enrich(doc_id):
+                    self.enriched += 1
+                    if written_at:
+                        delay = (datetime.now(timezone.utc) - written_at).total_seconds()
+                        print(f"Document {doc_id} enriched {delay:.1f} s after it was written.")
+            except Exception as e:
+                self.failed += 1
+                print(f"Error enriching document {doc_id}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.running.discard(doc_id)
+                    again = doc_id in self.changed
+                    self.changed.discard(doc_id)
+                if again:
+                    self.submit(doc_id)
+
+    def stop(self):
+        """Stop taking new documents; enrichments in progress are finished by run()."""
+        self.stopping.set()
+
+    def run(self):
+        """Listen and enrich until stop() is called, then drain the documents in progress."""
+        threads = [threading.Thread(target=self._work, name=f"enrich-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        watch = self.query.on_snapshot(self.on_snapshot)
+        print(f"Listening for pending documents with {self.workers} workers.")
+        while not self.stopping.wait(1):
+            pass
+
+        watch.unsubscribe()
+        with self.lock:
+            in_progress = len(self.running)
+        print(f"Stopping: finishing {in_progress} documents in progress, leaving {self.queue.qsize()} queued.")
+        for thread in threads:
+            thread.join()
+        print(f"Worker stopped. {self.enriched} documents enriched, {self.failed} failed.")
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime
+from analysis import analysis_ref, drop_placeholders
+from backfill_index import backfill
+from checkpoint import atomic_write_json
+from firebase_client import get_db
+from scheduling import publication_month
+from search_index import load_corpus, CHAMBER, INDEX_PATH
+
+EXPORT_DIR = "exports/bills"     # one Hive-style partition per collection and month, shared by both chambers
+CHAMBER_DIR = os.path.join(EXPORT_DIR, f"collection={CHAMBER}")
+STATE_PATH = os.path.join(CHAMBER_DIR, "_state.json")
+PARTITION_FILE = "data.parquet"
+ANALYSIS_BATCH = 100             # analysis subdocuments fetched per get_all
+
+STRING_COLUMNS = [
+    "title", "date", "description", "status", "chamber", "source_url", "pdf_url", "text_url",
+    "text_sha256", "content_sha256", "enriched_from",
+]
+INT_COLUMNS = ["bill_number", "gazette_supplement", "year", "page_count"]
+
+def export_schema():
+    import pyarrow as pa
+
+    entry = pa.list_(pa.struct([("title", pa.string()), ("explanation", pa.string())]))
+    return pa.schema(
+        [("id", pa.string())]
+        + [(column, pa.string()) for column in STRING_COLUMNS]
+        + [(column, pa.int64()) for column in INT_COLUMNS]
+        + [
+            ("duplicate_of", pa.string()),
+            ("positives", entry),
+            ("negatives", entry),
+            ("text", pa.string()),
+            ("updated_at", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def export_month(bill):
+    """Partition month of a bill: its upload month, else the month of its date, else "unknown"."""
+    month = publication_month(bill.get("source_url"))
+    if not month and (bill.get("date") or "")[:4].isdigit():
+        month = bill["date"][:7]
+    return month or "unknown"
+
+def export_row(doc_id, bill, analysis, text):
+    """Flatten a bill document, its analysis and its OCR text into one row of export_schema()."""
+    row = {"id": doc_id}
+    row.update({column: bill.get(column) for column in STRING_COLUMNS})
+    row.update({column: as_int(bill.get(column)) for column in INT_COLUMNS})
+    row["date"] = str(row["date"]) if row["date"] is not None else None
+    row["duplicate_of"] = (bill.get("duplicate_of") or {}).get("doc_id")
+    for key in ["positives", "negatives"]:
+        row[key] = [
+            {"title": entry.get("title", ""), "explanation": entry.get("explanation", "")}
+            for entry in drop_placeholders(analysis.get(key, bill.get(key)))
+        ]
+    row["text"] = text
+    row["updated_at"] = bill.get("updated_at")
+    return row
+
+def load_state(path=STATE_PATH):
+    """Load the high-water mark (latest updated_at exported) and the partition each document is in."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"high_water": None, "partitions": {}}
+
+def load_analyses(db, docs):
+    """Return {doc_id: analysis subdocument} for documents that have one, in batched reads."""
+    refs = [analysis_ref(doc.reference) for doc in docs if "analysis" in doc.to_dict()]
+    analyses = {}
+    for start in range(0, len(refs), ANALYSIS_BATCH):
+        for snapshot in db.get_all(refs[start:start + ANALYSIS_BATCH]):
+            if snapshot.exists:
+                analyses[snapshot.reference.parent.parent.id] = snapshot.to_dict()
+    return analyses
+
+def write_partition(partition, rows, removed_ids):
+    """Rewrite one partition file with rows replacing (by id) the rows it had, minus removed_ids."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    directory = os.path.join(CHAMBER_DIR, partition)
+    path = os.path.join(directory, PARTITION_FILE)
+    table = pa.Table.from_pylist(rows, schema=export_schema())
+
+    if os.path.exists(path):
+        existing = pq.read_table(path).cast(export_schema())
+        replaced = pa.array(sorted(set(row["id"] for row in rows) | removed_ids), pa.string())
+        existing = existing.filter(pc.invert(pc.is_in(existing["id"], value_set=replaced)))
+        table = pa.concat_tables([existing, table])
+
+    if table.num_rows == 0:
+        shutil.rmtree(directory, ignore_errors=True)
+        return 0
+
+    os.makedirs(directory, exist_ok=True)
+    pq.write_table(table.sort_by("id"), path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    return table.num_rows
+
+def export(full=False):
+    """Export the documents changed since the last run (all of them with full=True) to Parquet."""
+    db = get_db()
+    bills_ref = db.collection(CHAMBER)
+
+    if full:
+        shutil.rmtree(CHAMBER_DIR, ignore_errors=True)
+    state = load_state()
+
+    # Every pipeline write sets updated_at; the first export also takes documents written before it existed
+    if state["high_water"]:
+        high_water = datetime.fromisoformat(state["high_water"])
+        query = bills_ref.where("updated_at", ">", high_water).order_by("updated_at")
+    else:
+        query = bills_ref
+    docs = list(query.stream())
+    if not docs:
+        print(f"No {CHAMBER} documents changed since {state['high_water']}.")
+        return
+
+    # The OCR text comes from the local search index; only bills it lacks are fetched from their text_url
+    backfill(docs)
+    changed_ids = set(doc.id for doc in docs)
+    texts = {bill["doc_id"]: bill["text"] for bill in load_corpus({CHAMBER: INDEX_PATH}) if bill["doc_id"] in changed_ids}
+    analyses = load_analyses(db, docs)
+
+    rows = defaultdict(list)
+    removed = defaultdict(set)
+    latest = datetime.fromisoformat(state["high_water"]) if state["high_water"] else None
+    for doc in docs:
+        bill = doc.to_dict()
+        partition = f"month={export_month(bill)}"
+        rows[partition].append(export_row(doc.id, bill, analyses.get(doc.id, {}), texts.get(doc.id)))
+
+        previous = state["partitions"].get(doc.id)
+        if previous and previous != partition:
+            removed[previous].add(doc.id)
+        state["partitions"][doc.id] = partition
+
+        updated_at = bill.get("updated_at")
+        if updated_at and (latest is None or updated_at > latest):
+            latest = updated_at
+
+    for partition in sorted(set(rows) | set(removed)):
+        count = write_partition(partition, rows.get(partition, []), removed.get(partition, set()))
+        print(f"{partition}: {len(rows.get(partition, []))} documents exported, {count} in the partition")
+
+    state["high_water"] = latest.isoformat() if latest else None
+    os.makedirs(CHAMBER_DIR, exist_ok=True)
+    atomic_write_json(STATE_PATH, state, indent=2)
+    print(f"Exported {len(docs)} {CHAMBER} documents to {CHAMBER_DIR}. High-water mark: {state['high_water']}")
+
+def main():
+    """Export this chamber's documents to a local Parquet snapshot, incrementally."""
+    parser = argparse.ArgumentParser(description="Export bill documents to Parquet, partitioned by collection and month.")
+    parser.add_argument("--full", action="store_true", help="Re-export every document instead of only changed ones")
+    args = parser.parse_args()
+    export(args.full)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import re
+import time
+from firebase_client import get_db
+from throttle import throttled_call, FIRESTORE_URL
+
+CHAMBER = "sbills"
+LISTING_COLLECTION = "sbills_listing"
+MANIFEST_ID = "manifest"     # page order, counts and date ranges: what a listing screen reads first
+LOCATIONS_ID = "locations"   # doc_id -> page id, read only by the pipeline
+
+PAGE_SIZE = 100              # entries per page after a rebuild
+MAX_PAGE_ENTRIES = 200       # a page that grows past this is split in two
+LISTING_FIELDS = ["title", "date", "description"]
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def listing_entry(doc_id, bill):
+    """The compact {id, title, date, description} a listing shows for a bill. Dates that aren't ISO are blank."""
+    date = bill.get("date") or ""
+    return {
+        "id": doc_id,
+        "title": bill.get("title") or "",
+        "date": date if ISO_DATE.match(date) else "",
+        "description": bill.get("description") or "",
+    }
+
+def sort_key(entry):
+    """Pages are sorted on this key in descending order: newest first, undated bills last."""
+    return (entry["date"], entry["id"])
+
+def page_summary(page_id, entries):
+    return {
+        "id": page_id,
+        "count": len(entries),
+        "newest": entries[0]["date"],
+        "oldest": entries[-1]["date"],
+        "last": list(sort_key(entries[-1])),
+    }
+
+def new_manifest():
+    return {"page_size": PAGE_SIZE, "pages": [], "next_page": 0, "total": 0}
+
+def new_page_id(manifest):
+    page_id = f"page-{manifest['next_page']:04d}"
+    manifest["next_page"] += 1
+    return page_id
+
+def find_page(summaries, key):
+    """Index of the page a key belongs on: the first whose last (smallest) key it doesn't sort below."""
+    for index, summary in enumerate(summaries):
+        if key >= tuple(summary["last"]):
+            return index
+    return len(summaries) - 1
+
+def apply_entries(manifest, locations, load, entries):
+    """Move each entry to its sorted place in the pages, updating manifest and locations in place.
+
+    load(page_id) returns a page's entry list, reading it on first use. An entry
+    replaces the bill's previous one, keeping any field it leaves blank (ingestion
+    doesn't know the description). Pages that outgrow MAX_PAGE_ENTRIES are split
+    and pages left empty are dropped. Returns ({page_id: entries} to write, page ids to delete).
+    """
+    pages = {}
+    changed, removed = set(), set()
+    summaries = manifest["pages"]
+
+    def page(page_id):
+        if page_id not in pages:
+            pages[page_id] = load(page_id)
+        return pages[page_id]
+
+    def position(page_id):
+        return next(index for index, summary in enumerate(summaries) if summary["id"] == page_id)
+
+    def refresh(page_id):
+        entries = pages[page_id]
+        index = position(page_id)
+        if not entries:
+            del summaries[index]
+            changed.discard(page_id)
+            removed.add(page_id)
+            return
+        changed.add(page_id)
+        if len(entries) <= MAX_PAGE_ENTRIES:
+            summaries[index] = page_summary(page_id, entries)
+            return
+        half = len(entries) // 2
+        split_id = new_page_id(manifest)
+        pages[page_id], pages[split_id] = entries[:half], entries[half:]
+        for moved in pages[split_id]:
+            locations[moved["id"]] = split_id
+        summaries[index] = page_summary(page_id, pages[page_id])
+        summaries.insert(index + 1, page_summary(split_id, pages[split_id]))
+        changed.add(split_id)
+
+    for entry in entries:
+        old_page = locations.pop(entry["id"], None)
+        if old_page and any(summary["id"] == old_page for summary in summaries):
+            kept = [e for e in page(old_page) if e["id"] != entry["id"]]
+            previous = next((e for e in page(old_page) if e["id"] == entry["id"]), {})
+            entry = dict(entry, **{key: previous[key] for key in LISTING_FIELDS if not entry[key] and previous.get(key)})
+            pages[old_page] = kept
+            refresh(old_page)
+
+        if summaries:
+            page_id = summaries[find_page(summaries, sort_key(entry))]["id"]
+        else:
+            page_id = new_page_id(manifest)
+            pages[page_id] = []
+            summaries.append({"id": page_id})
+        page(page_id).append(entry)
+        page(page_id).sort(key=sort_key, reverse=True)
+        locations[entry["id"]] = page_id
+        refresh(page_id)
+
+    manifest["total"] = len(locations)
+    return {page_id: pages[page_id] for page_id in changed}, removed
+
+def update_listing(bills):
+    """Upsert the listing entries of [(doc_id, bill)] in one transaction."""
+    from firebase_admin import firestore
+
+    entries = [listing_entry(doc_id, bill) for doc_id, bill in bills]
+    if not entries:
+        return
+    db = get_db()
+    listing = db.collection(LISTING_COLLECTION)
+
+    @firestore.transactional
+    def update(transaction):
+        # Writes are buffered until commit, so pages can be read as they turn out to be needed
+        manifest_snapshot = listing.document(MANIFEST_ID).get(transaction=transaction)
+        locations_snapshot = listing.document(LOCATIONS_ID).get(transaction=transaction)
+        manifest = manifest_snapshot.to_dict() if manifest_snapshot.exists else new_manifest()
+        locations = locations_snapshot.to_dict().get("pages", {}) if locations_snapshot.exists else {}
+
+        def load(page_id):
+            snapshot = listing.document(page_id).get(transaction=transaction)
+            return snapshot.to_dict().get("entries", []) if snapshot.exists else []
+
+        changed, removed = apply_entries(manifest, locations, load, entries)
+        for page_id, page_entries in changed.items():
+            transaction.set(listing.document(page_id), {"entries": page_entries})
+        for page_id in removed:
+            transaction.delete(listing.document(page_id))
+        manifest["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        transaction.set(listing.document(MANIFEST_ID), manifest)
+        transaction.set(listing.document(LOCATIONS_ID), {"pages": locations})
+
+    throttled_call(FIRESTORE_URL, update, db.transaction())
+
+def rebuild_listing():
+    """Rewrite every listing page from the collection, PAGE_SIZE entries per page."""
+    db = get_db()
+    listing = db.collection(LISTING_COLLECTION)
+
+    # Only the listed fields are downloaded, not the positives/negatives arrays
+    entries = [
+        listing_entry(doc.id, doc.to_dict())
+        for doc in db.collection(CHAMBER).select(LISTING_FIELDS).stream()
+    ]
+    entries.sort(key=sort_key, reverse=True)
+
+    manifest = new_manifest()
+    locations = {}
+    batch = db.batch()
+    for start in range(0, len(entries), PAGE_SIZE):
+        page_id = new_page_id(manifest)
+        page_entries = entries[start:start + PAGE_SIZE]
+        manifest["pages"].append(page_summary(page_id, page_entries))
+        for entry in page_entries:
+            locations[entry["id"]] = page_id
+        batch.set(listing.document(page_id), {"entries": page_entries})
+
+    # Pages left over from the previous layout
+    kept = set(summary["id"] for summary in manifest["pages"]) | {MANIFEST_ID, LOCATIONS_ID}
+    for doc_ref in listing.list_documents():
+        if doc_ref.id not in kept:
+            batch.delete(doc_ref)
+
+    manifest["total"] = len(locations)
+    manifest["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    batch.set(listing.document(LOCATIONS_ID), {"pages": locations})
+    batch.set(listing.document(MANIFEST_ID), manifest)
+    throttled_call(FIRESTORE_URL, batch.commit)
+    print(f"Listing rebuilt: {len(entries)} bills on {len(manifest['pages'])} pages.")
+
+def main():
+    """Rebuild the paginated listing of the chamber's bills from Firestore."""
+    rebuild_listing()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import random
+import re
+from checkpoint import atomic_write_json
+
+CHAMBER = "sbills"
+
+# Both chambers are checked, since the same Senate bill is often listed by each
+MINHASH_PATHS = {
+    "pbills": "pbills/minhash_index.json",
+    "sbills": "sbills/minhash_index.json",
+}
+
+SHINGLE_WORDS = 5            # words per shingle
+NUM_PERMUTATIONS = 128       # signature length
+BANDS = 32                   # LSH bands of NUM_PERMUTATIONS // BANDS rows each
+SIMILARITY_THRESHOLD = 0.8   # estimated Jaccard similarity to flag a near-duplicate
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stay comparable between runs and chambers
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+def normalise_text(text):
+    """Lowercase and strip punctuation/digits so OCR noise and page numbers don't break shingles."""
+    return re.findall(r"[a-z]+", text.lower())
+
+def shingles(text):
+    """Return the set of hashed word shingles of a text."""
+    words = normalise_text(text)
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    return set(
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"), digest_size=4).digest(), "big")
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    )
+
+def minhash_signature(text):
+    """Compute the MinHash signature of a text."""
+    values = shingles(text)
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in values)
+        for a, b in _PERMUTATIONS
+    ]
+
+def estimate_similarity(first, second):
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / float(NUM_PERMUTATIONS)
+
+def band_keys(signature):
+    """Yield the LSH bucket keys of a signature, one per band."""
+    rows = NUM_PERMUTATIONS // BANDS
+    for band in range(BANDS):
+        yield f"{band}:{hash(tuple(signature[band * rows:(band + 1) * rows]))}"
+
+class MinHashIndex:
+    """Signatures of extracted bills with LSH buckets for fast near-duplicate lookup."""
+
+    def __init__(self, path, chamber):
+        self.path = path
+        self.chamber = chamber
+        self.entries = {}
+        self.buckets = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for pdf_url, signature in json.load(f).items():
+                    self._add_to_buckets(pdf_url, signature)
+
+    def _add_to_buckets(self, pdf_url, signature):
+        self.entries[pdf_url] = signature
+        for key in band_keys(signature):
+            self.buckets.setdefault(key, set()).add(pdf_url)
+
+    def add(self, pdf_url, signature):
+        """Add or replace a bill's signature."""
+        if pdf_url in self.entries:
+            for key in band_keys(self.entries[pdf_url]):
+                self.buckets.get(key, set()).discard(pdf_url)
+        self._add_to_buckets(pdf_url, signature)
+
+    def query(self, signature, exclude=None):
+        """Return [(similarity, pdf_url)] for bills above SIMILARITY_THRESHOLD, best first."""
+        candidates = set()
+        for key in band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(exclude)
+
+        matches = []
+        for pdf_url in candidates:
+            similarity = estimate_similarity(signature, self.entries[pdf_url])
+            if similarity >= SIMILARITY_THRESHOLD:
+                matches.append((similarity, pdf_url))
+        return sorted(matches, reverse=True)
+
+    def save(self):
+        atomic_write_json(self.path, self.entries)
+
+def load_indexes():
+    """Load this chamber's index (writable) and every chamber's index for lookups."""
+    indexes = {chamber: MinHashIndex(path, chamber) for chamber, path in MINHASH_PATHS.items()}
+    return indexes[CHAMBER], indexes
+
+def find_near_duplicate(indexes, pdf_url, signature):
+    """Return {"chamber", "pdf_url", "similarity"} for the closest near-duplicate in any chamber, or None."""
+    best = None
+    for chamber, index in indexes.items():
+        for similarity, match_url in index.query(signature, exclude=pdf_url)[:1]:
+            if best is None or similarity > best["similarity"]:
+                best = {"chamber": chamber, "pdf_url": match_url, "similarity": round(similarity, 3)}
+    return best
@@ -0,0 +1,71 @@
+import threading
+from collections import deque
+
+class PrefetchBuffer:
+    """A bounded hand-off between a producer thread and the consumer.
+
+    The buffer holds at most max_items items and max_bytes of payload. A single
+    item larger than max_bytes is still admitted when the buffer is empty, so
+    an oversized bill can't stall the pipeline.
+    """
+
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = deque()
+        self.bytes = 0
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def put(self, item, size):
+        """Add an item, blocking while the buffer is full."""
+        with self.condition:
+            while self.items and (len(self.items) >= self.max_items or self.bytes + size > self.max_bytes):
+                self.condition.wait()
+            self.items.append((item, size))
+            self.bytes += size
+            self.condition.notify_all()
+
+    def close(self, error=None):
+        """Mark the end of the input; error is re-raised in the consumer."""
+        with self.condition:
+            self.closed = True
+            self.error = error
+            self.condition.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self.condition:
+                while not self.items and not self.closed:
+                    self.condition.wait()
+                if not self.items:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                item, size = self.items.popleft()
+                self.bytes -= size
+                self.condition.notify_all()
+            yield item
+
+def prefetch(source, fetch, max_items, max_bytes):
+    """Run fetch() over source in a background thread and yield the results in order.
+
+    fetch(item) returns (result, size_in_bytes), or None to drop the item. Up to
+    max_items results (and max_bytes of them) are fetched ahead of the consumer.
+    """
+    buffer = PrefetchBuffer(max_items, max_bytes)
+
+    def produce():
+        try:
+            for item in source:
+                fetched = fetch(item)
+                if fetched is not None:
+                    buffer.put(*fetched)
+        except Exception as e:
+            buffer.close(e)
+        else:
+            buffer.close()
+
+    threading.Thread(target=produce, name="prefetch", daemon=True).start()
+    return iter(buffer)
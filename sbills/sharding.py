@@ -0,0 +1,173 @@
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from checkpoint import atomic_write_json
+
+SHARDS_DIR = "sbills/shards"
+LOCAL_LEASES_PATH = "sbills/leases.json"
+LEASE_COLLECTION = "sbills_leases"
+
+LEASE_SECONDS = 600          # a lease not renewed for this long is free for another worker to take
+RENEW_SECONDS = 120          # held leases are renewed this often while the work runs
+
+def parse_shard(value):
+    """Parse "i/N" into (i, N), e.g. "0/4" for the first of four workers."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {value!r}.")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got {value!r}.")
+    return index, count
+
+def shard_of(key, count):
+    """Stable shard number of a key (a pdf_url or document id) among count shards."""
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % count
+
+def in_shard(key, shard):
+    """True if key belongs to shard (an (i, N) pair), or if there is no sharding."""
+    return shard is None or shard_of(key, shard[1]) == shard[0]
+
+def shard_dir(shard):
+    """Directory a shard writes its extraction state to, e.g. sbills/shards/0-of-4."""
+    return os.path.join(SHARDS_DIR, f"{shard[0]}-of-{shard[1]}")
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def lease_id(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class Leases:
+    """Expiring claims on work items, renewed in the background while they are held.
+
+    A worker that crashes stops renewing, so its items become claimable again
+    LEASE_SECONDS later. Subclasses implement _claim (take the lease if it is
+    free, expired or already ours) and _drop.
+    """
+
+    def __init__(self, owner=None, ttl=LEASE_SECONDS):
+        self.owner = owner or worker_id()
+        self.ttl = ttl
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        threading.Thread(target=self._renew_loop, name="lease-renewal", daemon=True).start()
+
+    def acquire(self, key):
+        """Claim key for this worker. Returns False if another worker holds a live lease on it."""
+        if not self._claim(key):
+            return False
+        with self.lock:
+            self.held.add(key)
+        return True
+
+    def release(self, key):
+        with self.lock:
+            self.held.discard(key)
+        self._drop(key)
+
+    def close(self):
+        """Stop renewing and release every lease still held."""
+        self.stopped.set()
+        for key in list(self.held):
+            self.release(key)
+
+    def _renew_loop(self):
+        while not self.stopped.wait(RENEW_SECONDS):
+            with self.lock:
+                keys = list(self.held)
+            for key in keys:
+                try:
+                    renewed = self._claim(key)
+                except Exception as e:
+                    print(f"Error renewing lease on {key}: {str(e)}")
+                    continue
+                if not renewed:
+                    print(f"Lost the lease on {key} to another worker")
+                    with self.lock:
+                        self.held.discard(key)
+
+class LocalLeases(Leases):
+    """Leases in a JSON file under an flock: the stand-in for workers sharing one machine or volume."""
+
+    def __init__(self, path=LOCAL_LEASES_PATH, owner=None, ttl=LEASE_SECONDS):
+        self.path = path
+        super().__init__(owner, ttl)
+
+    def _update(self, change):
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    leases = json.load(f)
+            except FileNotFoundError:
+                leases = {}
+            result = change(leases, time.time())
+            atomic_write_json(self.path, leases, indent=2)
+            return result
+
+    def _claim(self, key):
+        def claim(leases, now):
+            lease = leases.get(key)
+            if lease and lease["owner"] != self.owner and lease["expires_at"] > now:
+                return False
+            leases[key] = {"owner": self.owner, "expires_at": now + self.ttl}
+            return True
+        return self._update(claim)
+
+    def _drop(self, key):
+        def drop(leases, now):
+            if leases.get(key, {}).get("owner") == self.owner:
+                del leases[key]
+        self._update(drop)
+
+class FirestoreLeases(Leases):
+    """Leases as documents in a Firestore collection, claimed in transactions, for workers on separate runners."""
+
+    def __init__(self, collection=LEASE_COLLECTION, owner=None, ttl=LEASE_SECONDS):
+        from firebase_client import get_db
+
+        self.db = get_db()
+        self.collection = self.db.collection(collection)
+        super().__init__(owner, ttl)
+
+    def _claim(self, key):
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def claim(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            now = time.time()
+            if snapshot.exists:
+                lease = snapshot.to_dict()
+                if lease["owner"] != self.owner and lease["expires_at"] > now:
+                    return False
+            transaction.set(ref, {"key": key, "owner": self.owner, "expires_at": now + self.ttl})
+            return True
+
+        return claim(self.db.transaction(), self.collection.document(lease_id(key)))
+
+    def _drop(self, key):
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def drop(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.to_dict()["owner"] == self.owner:
+                transaction.delete(ref)
+
+        drop(self.db.transaction(), self.collection.document(lease_id(key)))
+
+def open_leases(kind):
+    """Return the lease store for --leases: "firestore", "local" or None for no leases."""
+    if kind == "firestore":
+        return FirestoreLeases()
+    if kind == "local":
+        return LocalLeases()
+    return None
@@ -0,0 +1,20 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+from throttle import throttled_get
+
+def create_session():
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
+    session.mount("http://", HTTPAdapter(max_retries=retries))
+    session.mount("https://", HTTPAdapter(max_retries=retries))
+    return session
+
+def fetch_text_from_url(session, text_url):
+    try:
+        response = throttled_get(session.get, text_url, timeout=30)
+        response.raise_for_status()
+        return response.text
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching text from {text_url}: {str(e)}")
+        return None
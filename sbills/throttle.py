@@ -0,0 +1,152 @@
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# AIMD tuning shared by every remote host
+INITIAL_LIMIT = 2          # concurrent requests allowed before anything is known about the host
+MIN_LIMIT = 1
+MAX_LIMIT = 16
+INCREASE = 1.0             # added to the limit per window of successful, fast requests
+DECREASE = 0.5             # limit multiplier on a timeout, 5xx or 429
+SLOW_FACTOR = 3.0          # a request slower than this multiple of the host's baseline latency counts as congestion
+BACKOFF_SECONDS = 2.0      # pause after an error when the server sends no Retry-After
+MAX_BACKOFF_SECONDS = 120.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header (seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Slot:
+    """One request's outcome, filled in by the caller inside AdaptiveLimiter.slot()."""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+    def record(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+class AdaptiveLimiter:
+    """Additive-increase/multiplicative-decrease concurrency limit for one remote host.
+
+    The limit grows while requests succeed at close to the host's baseline
+    latency and halves on timeouts, 5xx and 429 responses. After an error, no
+    new request starts until the Retry-After delay (or a default backoff) has
+    passed.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.limit = float(INITIAL_LIMIT)
+        self.in_flight = 0
+        self.not_before = 0.0
+        self.baseline_latency = None
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                wait = self.not_before - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(timeout=wait if wait > 0 else None)
+            self.in_flight += 1
+
+    def release(self, latency, failed, retry_after=None):
+        with self.condition:
+            self.in_flight -= 1
+            if failed:
+                self.limit = max(MIN_LIMIT, self.limit * DECREASE)
+                delay = retry_after if retry_after is not None else BACKOFF_SECONDS
+                self.not_before = max(self.not_before, time.monotonic() + min(delay, MAX_BACKOFF_SECONDS))
+                print(f"Backing off {self.host}: limit {self.limit:.1f}, pausing {min(delay, MAX_BACKOFF_SECONDS):.0f}s")
+            else:
+                if self.baseline_latency is None or latency < self.baseline_latency:
+                    self.baseline_latency = latency
+                else:
+                    # Let the baseline drift up slowly so one lucky request doesn't pin it
+                    self.baseline_latency += 0.05 * (latency - self.baseline_latency)
+                if latency <= SLOW_FACTOR * self.baseline_latency:
+                    self.limit = min(MAX_LIMIT, self.limit + INCREASE / self.limit)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the host's request slots.
+
+        An exception counts as a failure (e.g. a timeout) unless the caller
+        recorded a non-retryable status such as 404 before raising it.
+        """
+        self.acquire()
+        outcome = Slot()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except Exception:
+            failed = outcome.status is None or outcome.status in RETRYABLE_STATUSES
+            self.release(time.monotonic() - start, failed, outcome.retry_after)
+            raise
+        failed = outcome.status in RETRYABLE_STATUSES
+        self.release(time.monotonic() - start, failed, outcome.retry_after)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def limiter_for(url):
+    """Return the process-wide limiter for the host of url."""
+    host = urlparse(url).netloc or url
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(host)
+        return _limiters[host]
+
+def throttled_get(get, url, retries=3, **kwargs):
+    """Call get(url, **kwargs) through the host's limiter, retrying 429/5xx responses, timeouts and dropped connections.
+
+    get is requests.get or a Session's get; the last response is returned, or
+    the last timeout/connection error raised.
+    """
+    import requests
+
+    limiter = limiter_for(url)
+    for attempt in range(retries + 1):
+        try:
+            with limiter.slot() as slot:
+                response = get(url, **kwargs)
+                slot.record(response.status_code, response.headers.get("Retry-After"))
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            if attempt == retries:
+                raise
+            continue  # the limiter has backed off before the next attempt
+        if response.status_code not in RETRYABLE_STATUSES or attempt == retries:
+            return response
+    return response
+
+# Google endpoints get their own limiters, shared by every upload and write in the process
+STORAGE_URL = "https://storage.googleapis.com"
+FIRESTORE_URL = "https://firestore.googleapis.com"
+
+def throttled_call(url, call, *args, **kwargs):
+    """Run a client-library call (Storage upload, Firestore write) in the limiter slot for url's host.
+
+    A Google API error's HTTP status decides whether the limiter backs off.
+    """
+    with limiter_for(url).slot() as slot:
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            slot.record(getattr(e, "code", None))
+            raise